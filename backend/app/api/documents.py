@@ -1,25 +1,60 @@
 # backend/app/api/documents.py
 
 import os
+import json
 import shutil
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, BackgroundTasks
-from pydantic import BaseModel, HttpUrl
+import hashlib
+import time
+import aiofiles
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, BackgroundTasks
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field, HttpUrl
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 import uuid
 
 from app.db.database import get_db
 from app.db import models
-from app.services.ingestion import process_document_task, delete_document_task
-from typing import List
+from app.services.ingestion import delete_document_task
+from app.services.task_queue import get_task_queue, enqueue_document_processing
+from arq import ArqRedis
+from typing import List, Optional, Tuple, Union
 
 router = APIRouter()
 UPLOAD_DIRECTORY = "./temp_uploads"
-os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
+UPLOAD_READ_SIZE = 1 << 20 # Read uploads in 1 MiB chunks
+# Parts of PDFs uploaded in pieces, one folder per upload until it is finalized
+UPLOAD_PARTS_DIRECTORY = os.path.join(UPLOAD_DIRECTORY, "parts")
+# Limits on a piecewise upload: the size of each part and the number of parts
+UPLOAD_PART_MAX_SIZE = int(os.getenv("UPLOAD_PART_MAX_SIZE", str(16 << 20)))
+UPLOAD_PART_MAX_COUNT = int(os.getenv("UPLOAD_PART_MAX_COUNT", "256"))
+# Part folders untouched for this long (seconds) belong to abandoned uploads
+UPLOAD_PARTS_MAX_AGE = int(os.getenv("UPLOAD_PARTS_MAX_AGE", str(24 * 3600)))
+
+def _sweep_stale_parts():
+    """Removes the part folders of uploads that were never finalized."""
+    cutoff = time.time() - UPLOAD_PARTS_MAX_AGE
+    with os.scandir(UPLOAD_PARTS_DIRECTORY) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            except OSError:
+                pass
+
+os.makedirs(UPLOAD_PARTS_DIRECTORY, exist_ok=True)
+_sweep_stale_parts()
 
 # --- Pydantic Models ---
 class UrlRequest(BaseModel):
     url: HttpUrl
 
+class FinalizeUploadRequest(BaseModel):
+    upload_id: uuid.UUID
+    filename: str
+    part_count: int = Field(..., ge=1, le=UPLOAD_PART_MAX_COUNT)
+
 class DocumentResponse(BaseModel):
     id: uuid.UUID
     filename: str
@@ -31,16 +66,53 @@ class DocumentResponse(BaseModel):
     class Config:
         orm_mode = True
 
+class JobResponse(BaseModel):
+    id: uuid.UUID
+    filename: str
+    status: models.DocumentStatus
+
+class DocumentListResponse(BaseModel):
+    documents: List[DocumentResponse]
+    jobs: List[JobResponse]
+
 # --- Endpoints ---
 
-@router.get("/api/documents", response_model=List[DocumentResponse])
-async def get_documents(db: Session = Depends(get_db)):
-    """Returns a list of all uploaded documents."""
-    documents = db.query(models.Document).order_by(models.Document.upload_date.desc()).all()
-    # Convert datetime to string for Pydantic
-    for doc in documents:
-        doc.upload_date = doc.upload_date.isoformat()
-    return documents
+@router.get("/api/documents", response_model=Union[List[DocumentResponse], DocumentListResponse])
+async def get_documents(include_jobs: bool = False, db: Session = Depends(get_db)):
+    """
+    Returns a list of all uploaded documents. With `include_jobs`, also lists the
+    documents still being processed, so clients can poll both with one request.
+    """
+    # Select only the response columns; no ORM instances are built or mutated
+    rows = db.execute(
+        select(
+            models.Document.id,
+            models.Document.filename,
+            models.Document.source_type,
+            models.Document.status,
+            models.Document.upload_date,
+            models.Document.chunk_count,
+        ).order_by(models.Document.upload_date.desc())
+    ).all()
+    documents = [
+        DocumentResponse(
+            id=row.id,
+            filename=row.filename,
+            source_type=row.source_type,
+            status=row.status,
+            upload_date=row.upload_date.isoformat(),
+            chunk_count=row.chunk_count,
+        )
+        for row in rows
+    ]
+    if not include_jobs:
+        return documents
+    jobs = [
+        JobResponse(id=row.id, filename=row.filename, status=row.status)
+        for row in rows
+        if row.status == models.DocumentStatus.processing
+    ]
+    return DocumentListResponse(documents=documents, jobs=jobs)
 
 @router.delete("/api/documents/{document_id}", status_code=204)
 async def delete_document(
@@ -72,48 +144,164 @@ async def delete_document(
     
     return None
 
+def _content_hasher():
+    # Must match the hash clients send to /api/documents/by_hash
+    return hashlib.blake2b(digest_size=32)
+
+async def _write_upload(file: UploadFile, file_path: str, max_size: Optional[int] = None) -> str:
+    """
+    Streams an uploaded file to disk without blocking the event loop and
+    returns the hash of its content, computed on the way through. With
+    `max_size`, larger files are rejected with a 413 and nothing is kept.
+    """
+    hasher = _content_hasher()
+    written = 0
+    try:
+        if max_size is not None and file.size and file.size > max_size:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {max_size} bytes.")
+        async with aiofiles.open(file_path, "wb") as buffer:
+            # Preallocate when the size is known to avoid growing the file piecemeal
+            if file.size and hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(buffer.fileno(), 0, file.size)
+            while chunk := await file.read(UPLOAD_READ_SIZE):
+                written += len(chunk)
+                if max_size is not None and written > max_size:
+                    raise HTTPException(status_code=413, detail=f"Upload exceeds {max_size} bytes.")
+                hasher.update(chunk)
+                await buffer.write(chunk)
+    except Exception:
+        # Rejected or interrupted uploads leave no partial file behind
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    finally:
+        await file.close()
+    return hasher.hexdigest()
+
+def _find_by_hash(db: Session, content_hash: str) -> Optional[models.Document]:
+    return db.execute(
+        select(models.Document).where(models.Document.content_hash == content_hash)
+    ).scalar_one_or_none()
+
+def _new_pdf_path(filename: str) -> str:
+    file_extension = os.path.splitext(filename)[1]
+    return os.path.join(UPLOAD_DIRECTORY, f"{uuid.uuid4()}{file_extension}")
+
+async def _record_pdf(
+    filename: str,
+    file_path: str,
+    content_hash: str,
+    background_tasks: BackgroundTasks,
+    db: Session,
+    task_queue: Optional[ArqRedis],
+) -> Tuple[models.Document, bool]:
+    """
+    Records a PDF saved at `file_path` and queues it for processing. If the same
+    content is already stored, the new copy is discarded and the existing document
+    returned instead; the flag says whether the document is new.
+    """
+    try:
+        existing = _find_by_hash(db, content_hash)
+        if existing and existing.status == models.DocumentStatus.failed:
+            # A failed ingestion shouldn't block trying again, so it gives up its hash
+            existing.content_hash = None
+            db.commit()
+        elif existing:
+            os.remove(file_path)
+            return existing, False
+
+        new_document = models.Document(
+            filename=filename,
+            saved_file_path=file_path,
+            content_hash=content_hash,
+            source_type=models.SourceType.pdf,
+            status=models.DocumentStatus.processing
+        )
+        db.add(new_document)
+        try:
+            db.commit()
+        except IntegrityError:
+            # The same file was recorded by a concurrent upload
+            db.rollback()
+            os.remove(file_path)
+            return _find_by_hash(db, content_hash), False
+        db.refresh(new_document)
+    except Exception:
+        # Don't leave behind a file that no document points to
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+
+    await enqueue_document_processing(new_document.id, background_tasks, task_queue)
+    return new_document, True
+
+async def _save_pdf_upload(
+    file: UploadFile,
+    background_tasks: BackgroundTasks,
+    db: Session,
+    task_queue: Optional[ArqRedis],
+) -> Tuple[models.Document, bool]:
+    """Writes an uploaded PDF to disk, records it and queues it for processing."""
+    file_path = _new_pdf_path(file.filename)
+    content_hash = await _write_upload(file, file_path)
+    return await _record_pdf(file.filename, file_path, content_hash, background_tasks, db, task_queue)
+
+def _upload_response(document: models.Document, is_new: bool) -> dict:
+    return {
+        "message": (
+            "File accepted and is being processed in the background." if is_new
+            else "This file has already been uploaded."
+        ),
+        "document_id": document.id,
+        "original_filename": document.filename,
+        "duplicate": not is_new,
+    }
+
 @router.post("/api/documents/upload", status_code=202)
 async def upload_document(
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...), 
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    task_queue: Optional[ArqRedis] = Depends(get_task_queue)
 ):
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file name provided.")
 
-    file_extension = os.path.splitext(file.filename)[1]
-    saved_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(UPLOAD_DIRECTORY, saved_filename)
+    document, is_new = await _save_pdf_upload(file, background_tasks, db, task_queue)
+    return _upload_response(document, is_new)
 
-    try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    finally:
-        file.file.close()
-
-    new_document = models.Document(
-        filename=file.filename,
-        saved_file_path=file_path,
-        source_type=models.SourceType.pdf,
-        status=models.DocumentStatus.processing
-    )
-    db.add(new_document)
-    db.commit()
-    db.refresh(new_document)
-
-    background_tasks.add_task(process_document_task, new_document.id)
+@router.post("/api/documents/upload_batch", status_code=202)
+async def upload_documents(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_db),
+    task_queue: Optional[ArqRedis] = Depends(get_task_queue)
+):
+    """
+    Accepts several PDFs in one multipart request. Responds with one NDJSON line
+    per file as soon as it is saved and queued, so clients can show progress.
+    """
+    async def results():
+        for file in files:
+            if not file.filename:
+                result = {"filename": "", "error": "No file name provided."}
+            else:
+                try:
+                    document, is_new = await _save_pdf_upload(file, background_tasks, db, task_queue)
+                    result = {"filename": file.filename, "document_id": str(document.id), "duplicate": not is_new}
+                except Exception as e:
+                    db.rollback()
+                    result = {"filename": file.filename, "error": str(e)}
+            yield json.dumps(result) + "\n"
 
-    return {
-        "message": "File accepted and is being processed in the background.",
-        "document_id": new_document.id,
-        "original_filename": new_document.filename,
-    }
+    return StreamingResponse(results(), status_code=202, media_type="application/x-ndjson")
 
 @router.post("/api/documents/youtube", status_code=202)
 async def add_youtube_document(
     request: UrlRequest,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    task_queue: Optional[ArqRedis] = Depends(get_task_queue)
 ):
     url = str(request.url)
     new_document = models.Document(
@@ -126,7 +314,7 @@ async def add_youtube_document(
     db.add(new_document)
     db.commit()
     db.refresh(new_document)
-    background_tasks.add_task(process_document_task, new_document.id)
+    await enqueue_document_processing(new_document.id, background_tasks, task_queue)
     return {
         "message": "YouTube URL accepted and is being processed in the background.",
         "document_id": new_document.id,
@@ -137,7 +325,8 @@ async def add_youtube_document(
 async def add_web_document(
     request: UrlRequest,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    task_queue: Optional[ArqRedis] = Depends(get_task_queue)
 ):
     """
     Accepts a web page URL, creates a document record, and starts
@@ -156,10 +345,79 @@ async def add_web_document(
     db.commit()
     db.refresh(new_document)
 
-    background_tasks.add_task(process_document_task, new_document.id)
+    await enqueue_document_processing(new_document.id, background_tasks, task_queue)
 
     return {
         "message": "Web page URL accepted and is being processed in the background.",
         "document_id": new_document.id,
         "source_url": url,
     }
+
+@router.post("/api/documents/upload_part", status_code=204)
+async def upload_document_part(
+    upload_id: uuid.UUID = Form(...),
+    index: int = Form(..., ge=0, lt=UPLOAD_PART_MAX_COUNT),
+    part: UploadFile = File(...),
+):
+    """
+    Stores one part of a PDF sent in pieces. Parts may arrive in any order, and
+    re-sending a part (e.g. after a dropped connection) replaces it. Parts over
+    UPLOAD_PART_MAX_SIZE are rejected.
+    """
+    parts_dir = os.path.join(UPLOAD_PARTS_DIRECTORY, str(upload_id))
+    os.makedirs(parts_dir, exist_ok=True)
+    part_path = os.path.join(parts_dir, str(index))
+    # Written under a temporary name so an interrupted part never looks complete
+    await _write_upload(part, part_path + ".tmp", max_size=UPLOAD_PART_MAX_SIZE)
+    os.replace(part_path + ".tmp", part_path)
+    return None
+
+@router.post("/api/documents/finalize", status_code=202)
+async def finalize_document_upload(
+    request: FinalizeUploadRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    task_queue: Optional[ArqRedis] = Depends(get_task_queue)
+):
+    """Joins the parts of a PDF sent via upload_part in order and processes it."""
+    if not request.filename:
+        raise HTTPException(status_code=400, detail="No file name provided.")
+    # Finalizing is rare enough to also clear out uploads abandoned part-way
+    _sweep_stale_parts()
+
+    parts_dir = os.path.join(UPLOAD_PARTS_DIRECTORY, str(request.upload_id))
+    part_paths = [os.path.join(parts_dir, str(index)) for index in range(request.part_count)]
+    missing = [index for index, path in enumerate(part_paths) if not os.path.exists(path)]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing upload parts: {missing}")
+
+    file_path = _new_pdf_path(request.filename)
+    hasher = _content_hasher()
+    try:
+        async with aiofiles.open(file_path, "wb") as buffer:
+            for path in part_paths:
+                async with aiofiles.open(path, "rb") as part:
+                    while chunk := await part.read(UPLOAD_READ_SIZE):
+                        hasher.update(chunk)
+                        await buffer.write(chunk)
+    except Exception:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    shutil.rmtree(parts_dir, ignore_errors=True)
+
+    document, is_new = await _record_pdf(
+        request.filename, file_path, hasher.hexdigest(), background_tasks, db, task_queue
+    )
+    return _upload_response(document, is_new)
+
+@router.head("/api/documents/by_hash/{content_hash}")
+async def find_document_by_hash(content_hash: str, db: Session = Depends(get_db)):
+    """
+    Lets clients skip uploading a PDF that is already stored: 200 (with the
+    document's id in X-Document-Id) if its content hash is known, else 404.
+    """
+    document = _find_by_hash(db, content_hash)
+    if not document or document.status == models.DocumentStatus.failed:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return Response(status_code=200, headers={"X-Document-Id": str(document.id)})
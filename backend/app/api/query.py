@@ -1,16 +1,16 @@
 # backend/app/api/query.py
 
+import re
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict
 
-from app.services.retrieval import RetrievalService
-from app.services.llm import LLMProvider
-from app.utils.embeddings import get_embedding_model, EmbeddingModel
-from app.services.llm import get_llm_provider
+from app.services.retrieval import RetrievalService, get_retrieval_service
 
 router = APIRouter()
+# SSE ends a line at any of CRLF, CR or LF, so a stray CR must not reach a data field
+SSE_LINE_BREAK = re.compile(r"\r\n|\r|\n")
 
 class QueryRequest(BaseModel):
     query: str
@@ -20,16 +20,6 @@ class QueryResponse(BaseModel):
     text: str
     sources: List[Dict]
 
-from app.services.bm25 import get_bm25_service, BM25Service
-
-def get_retrieval_service(
-    embedding_model: EmbeddingModel = Depends(get_embedding_model),
-    llm_provider: LLMProvider = Depends(get_llm_provider),
-    bm25_service: BM25Service = Depends(get_bm25_service),
-) -> RetrievalService:
-    """Dependency to create a RetrievalService instance."""
-    return RetrievalService(embedding_model, llm_provider, bm25_service)
-
 def _build_prompt(query: str, context_chunks: List[Dict]) -> str:
     """Builds a detailed prompt for the LLM with context and instructions."""
     
@@ -50,6 +40,15 @@ def _build_prompt(query: str, context_chunks: List[Dict]) -> str:
     """
     return prompt
 
+async def _sse_events(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Frames each text chunk as a server-sent event. A chunk spanning several lines
+    becomes one `data:` field per line, which clients join back with newlines.
+    """
+    async for chunk in chunks:
+        if chunk:
+            yield "".join([f"data: {line}\n" for line in SSE_LINE_BREAK.split(chunk)]) + "\n"
+
 @router.post("/api/query")
 async def query(
     request: QueryRequest,
@@ -60,6 +59,8 @@ async def query(
     and streams the LLM's response.
     """
     return StreamingResponse(
-        retrieval_service.generate_response(request.query, request.enhance_with_ai), 
-        media_type="text/event-stream"
+        _sse_events(retrieval_service.generate_response(request.query, request.enhance_with_ai)),
+        media_type="text/event-stream",
+        # Keep proxies from caching or buffering the event stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
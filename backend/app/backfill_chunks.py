@@ -0,0 +1,91 @@
+# backend/app/backfill_chunks.py
+
+"""
+One-off backfill of the `chunks` table, for deployments that indexed documents
+before the BM25 corpus moved out of bm25_index.pkl. Run from backend/ after
+`alembic upgrade head`:
+
+    python -m app.backfill_chunks [path/to/bm25_index.pkl]
+
+Chunks are read from the pickle when it exists, and otherwise from the Qdrant
+payloads (`text`, `document_id`, `source_filename`). Documents that already
+have rows in `chunks` are skipped, so the script is safe to re-run.
+"""
+
+import os
+import pickle
+import sys
+from collections import defaultdict
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+
+load_dotenv()
+
+from app.db.database import SessionLocal
+from app.db.models import Chunk
+from app.db.qdrant import QDRANT_COLLECTION_NAME, qdrant_client
+from app.services.bm25 import bm25_service
+
+BM25_INDEX_PATH = "bm25_index.pkl"
+# Points fetched per Qdrant scroll request
+SCROLL_LIMIT = 1000
+
+
+def _from_pickle(path: str):
+    """Yields (text, metadata) for every chunk stored in the old pickle index."""
+    with open(path, "rb") as f:
+        data = pickle.load(f)
+    for doc in data.get("documents", []):
+        yield doc["text"], doc["metadata"]
+
+
+def _from_qdrant():
+    """Yields (text, metadata) for every point in the collection, from its payload."""
+    offset = None
+    while True:
+        points, offset = qdrant_client.scroll(
+            collection_name=QDRANT_COLLECTION_NAME,
+            limit=SCROLL_LIMIT,
+            offset=offset,
+            with_payload=["text", "document_id", "source_filename"],
+            with_vectors=False,
+        )
+        for point in points:
+            payload = point.payload or {}
+            if "text" in payload and "document_id" in payload:
+                yield payload["text"], {"document_id": payload["document_id"], "source_filename": payload.get("source_filename")}
+        if offset is None:
+            return
+
+
+def backfill(path: str = BM25_INDEX_PATH):
+    if os.path.exists(path):
+        print(f"Backfilling chunks from {path}...")
+        source = _from_pickle(path)
+    else:
+        print(f"{path} not found, backfilling chunks from Qdrant collection '{QDRANT_COLLECTION_NAME}'...")
+        source = _from_qdrant()
+
+    by_doc = defaultdict(list)
+    for text, metadata in source:
+        by_doc[str(metadata["document_id"])].append((text, metadata))
+
+    db = SessionLocal()
+    try:
+        existing = {str(doc_id) for doc_id in db.scalars(select(Chunk.document_id).distinct())}
+    finally:
+        db.close()
+
+    added = 0
+    for doc_id, rows in by_doc.items():
+        if doc_id in existing:
+            continue
+        metadatas = [{"document_id": doc_id, "source_filename": meta.get("source_filename")} for _, meta in rows]
+        bm25_service.add_documents([text for text, _ in rows], metadatas)
+        added += 1
+    print(f"Backfilled {added} documents ({len(by_doc) - added} already present).")
+
+
+if __name__ == "__main__":
+    backfill(*sys.argv[1:2])
@@ -14,12 +14,22 @@ if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is not set. Please check your .env file.")
 
 # Create the SQLAlchemy engine
-# The connect_args are recommended for SQLite, but generally safe for other DBs.
-# For PostgreSQL, they are not strictly necessary.
-engine = create_engine(DATABASE_URL)
+# The pool is sized for the API's request handlers plus concurrent background
+# ingestion tasks. pool_pre_ping transparently replaces connections that went
+# stale (e.g. after a database restart), and pool_recycle retires them before
+# hosted databases drop idle connections.
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "40")),
+    pool_pre_ping=True,
+    pool_recycle=1800,
+)
 
 # Create a configured "Session" class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False keeps loaded attributes usable after a commit instead
+# of re-SELECTing them on next access.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 # Create a base class for our models to inherit from
 Base = declarative_base()
@@ -1,7 +1,7 @@
 # backend/app/db/models.py
 
 import uuid
-from sqlalchemy import Column, String, DateTime, Integer, Enum, JSON
+from sqlalchemy import Column, String, DateTime, Integer, BigInteger, Enum, JSON, Text, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 import enum
@@ -25,9 +25,11 @@ class Document(Base):
     # Use PostgreSQL's UUID type for the primary key
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     
-    user_id = Column(String, default="default_user", nullable=False)
+    user_id = Column(String, default="default_user", nullable=False, index=True)
     filename = Column(String, nullable=False)
     saved_file_path = Column(String, nullable=False)
+    # BLAKE2b-256 of an uploaded file's content, so the same PDF is only ingested once
+    content_hash = Column(String, nullable=True, unique=True, index=True)
     
     source_type = Column(Enum(SourceType), nullable=False)
     source_url = Column(String, nullable=True)
@@ -41,5 +43,34 @@ class Document(Base):
     # For simplicity, we use the generic JSON type here.
     meta_data = Column(JSON, nullable=True)
 
+    __table_args__ = (
+        # Serves the newest-first document listing without a sort
+        Index("ix_documents_upload_date_desc", upload_date.desc()),
+    )
+
     def __repr__(self):
         return f"<Document(id={self.id}, filename='{self.filename}', status='{self.status}')>"
+
+
+class Chunk(Base):
+    __tablename__ = "chunks"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    document_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    source_filename = Column(String, nullable=True)
+    text = Column(Text, nullable=False)
+
+    # Pre-tokenized text, so the BM25 index can be rebuilt without re-tokenizing
+    tokens = Column(JSON, nullable=False)
+
+    def __repr__(self):
+        return f"<Chunk(id={self.id}, document_id={self.document_id})>"
+
+
+class ChunkRevision(Base):
+    __tablename__ = "chunk_revision"
+
+    # A single row, bumped in the same transaction as every write to `chunks`, so
+    # other processes can tell cheaply and reliably when their BM25 index is stale
+    id = Column(Integer, primary_key=True)
+    revision = Column(BigInteger, nullable=False, default=0)
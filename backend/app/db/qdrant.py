@@ -0,0 +1,99 @@
+# backend/app/db/qdrant.py
+
+import os
+import threading
+import grpc
+from qdrant_client import AsyncQdrantClient, QdrantClient, models as qdrant_models
+from dotenv import load_dotenv
+
+from app.utils.embeddings import EMBEDDING_DIMENSION
+
+load_dotenv()
+
+# --- Qdrant Configuration ---
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_COLLECTION_NAME = "knowledge_base"
+# Set to "gzip" to compress gRPC messages, worth it when Qdrant is reached over
+# the internet (e.g. Qdrant Cloud): chunk text in payloads compresses well.
+# Qdrant only supports gzip; leave unset for a local instance.
+QDRANT_GRPC_COMPRESSION = grpc.Compression.Gzip if os.getenv("QDRANT_GRPC_COMPRESSION", "").lower() == "gzip" else None
+# Storage precision for new collections. float16 halves vector memory and the
+# bytes scanned per search with negligible effect on cosine ranking.
+QDRANT_VECTOR_DATATYPE = qdrant_models.Datatype(os.getenv("QDRANT_VECTOR_DATATYPE", "float16"))
+
+# A single client shared by ingestion and retrieval, so requests reuse one
+# connection instead of opening a new pool per request. gRPC keeps one persistent
+# HTTP/2 channel open and serializes with protobuf instead of JSON: vectors go as
+# packed float32, roughly a quarter of the bytes per upsert.
+qdrant_client = QdrantClient(
+    url=QDRANT_URL,
+    api_key=QDRANT_API_KEY,
+    prefer_grpc=True,
+    grpc_port=QDRANT_GRPC_PORT,
+    grpc_compression=QDRANT_GRPC_COMPRESSION,
+    timeout=60,
+)
+# The asyncio counterpart, for code running on an event loop. Its gRPC channel is
+# opened lazily, on the loop of the first call.
+async_qdrant_client = AsyncQdrantClient(
+    url=QDRANT_URL,
+    api_key=QDRANT_API_KEY,
+    prefer_grpc=True,
+    grpc_port=QDRANT_GRPC_PORT,
+    grpc_compression=QDRANT_GRPC_COMPRESSION,
+    timeout=60,
+)
+_collection_checked = False
+_collection_lock = threading.Lock()
+
+
+def ensure_qdrant_collection_exists():
+    """Creates the collection if needed. Only checks Qdrant once per process."""
+    global _collection_checked
+    if _collection_checked:
+        return
+    with _collection_lock:
+        if _collection_checked:
+            return
+        try:
+            collection_info = qdrant_client.get_collection(collection_name=QDRANT_COLLECTION_NAME)
+            # Check if vector size matches Gemini's 768
+            if collection_info.config.params.vectors.size != EMBEDDING_DIMENSION:
+                print(f"Collection '{QDRANT_COLLECTION_NAME}' has incorrect vector size. Recreating...")
+                qdrant_client.delete_collection(collection_name=QDRANT_COLLECTION_NAME)
+                raise Exception("Collection deleted to force recreation.")
+        except Exception:
+            qdrant_client.create_collection(
+                collection_name=QDRANT_COLLECTION_NAME,
+                vectors_config=qdrant_models.VectorParams(
+                    size=EMBEDDING_DIMENSION,
+                    distance=qdrant_models.Distance.COSINE,
+                    datatype=QDRANT_VECTOR_DATATYPE,
+                ),
+                # Keep an int8 copy of every vector in RAM for the HNSW traversal;
+                # the full vectors are only read to rescore the final candidates
+                quantization_config=qdrant_models.ScalarQuantization(
+                    scalar=qdrant_models.ScalarQuantizationConfig(
+                        type=qdrant_models.ScalarType.INT8,
+                        always_ram=True,
+                    ),
+                ),
+                hnsw_config=qdrant_models.HnswConfigDiff(m=32, ef_construct=256),
+            )
+        _collection_checked = True
+
+
+def get_qdrant_client() -> QdrantClient:
+    """
+    Dependency function to get the shared Qdrant client.
+    """
+    return qdrant_client
+
+
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    """
+    Dependency function to get the shared asyncio Qdrant client.
+    """
+    return async_qdrant_client
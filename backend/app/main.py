@@ -1,6 +1,8 @@
 import os
+import asyncio
 from fastapi import FastAPI
 from fastapi.responses import StreamingResponse
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES, GZipMiddleware
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -8,6 +10,9 @@ load_dotenv()
 
 # Import our LLM service and the new routers
 from app.services.llm import get_llm_provider
+from app.services.task_queue import create_task_queue
+from app.services.bm25 import get_bm25_service
+from app.db.qdrant import ensure_qdrant_collection_exists
 from app.api import documents, query
 
 app = FastAPI(
@@ -16,6 +21,15 @@ app = FastAPI(
     version="0.1.0",
 )
 
+# Compress larger responses such as the polled document list. Streams are left
+# alone: gzip would hold back answer tokens and upload results until a block fills.
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=1000,
+    compresslevel=6,
+    exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES + ("application/x-ndjson",),
+)
+
 # Include the routers
 app.include_router(documents.router)
 app.include_router(query.router)
@@ -29,6 +43,48 @@ except (ValueError, ImportError) as e:
     print(f"Error initializing LLM provider: {e}")
     llm_provider = None
 
+@app.on_event("startup")
+async def connect_task_queue():
+    """Connects to the ingestion task queue, if one is configured."""
+    app.state.task_queue = await create_task_queue()
+
+@app.on_event("startup")
+async def check_qdrant_collection():
+    """
+    Makes sure the Qdrant collection exists once at startup rather than on the
+    first ingestion. A Qdrant outage is logged, not fatal: the check is retried
+    on the next ingestion.
+    """
+    try:
+        await asyncio.to_thread(ensure_qdrant_collection_exists)
+    except Exception as e:
+        print(f"Warning: could not check Qdrant collection at startup: {e}")
+
+@app.on_event("shutdown")
+async def close_task_queue():
+    if app.state.task_queue is not None:
+        await app.state.task_queue.close()
+
+async def _warm_up():
+    try:
+        await asyncio.to_thread(get_bm25_service().warm)
+        print("BM25 index warmed up.")
+    except Exception as e:
+        print(f"Warning: could not warm up BM25 index: {e}")
+        # Let the next /healthz call try again
+        app.state.warm_up = None
+
+@app.get("/healthz")
+async def healthz():
+    """
+    Cheap liveness check that clients call on start to open their connections.
+    The first call also builds lazily loaded state in the background, so the
+    first real query doesn't pay for it.
+    """
+    if getattr(app.state, "warm_up", None) is None:
+        app.state.warm_up = asyncio.create_task(_warm_up())
+    return {"status": "ok"}
+
 @app.get("/")
 def read_root():
     """
@@ -1,119 +1,376 @@
 import os
-import pickle
-import re
-from typing import List, Dict
-from rank_bm25 import BM25Okapi
+import string
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from itertools import chain
+from typing import List, Dict, NamedTuple, Optional
+import numpy as np
+from sqlalchemy import select, insert, update, delete
 
-BM25_INDEX_PATH = "bm25_index.pkl"
+from app.db.database import SessionLocal, engine
+from app.db.models import Chunk, ChunkRevision
+
+# How often (seconds) to check whether another process changed the chunks table
+BM25_REFRESH_INTERVAL = float(os.getenv("BM25_REFRESH_INTERVAL", "5"))
+# Deleted chunks are tombstoned in place; rebuild once this fraction of the index is dead
+TOMBSTONE_REBUILD_FRACTION = 0.25
+# Number of recent (query, k) results cached per snapshot
+SEARCH_CACHE_SIZE = int(os.getenv("BM25_SEARCH_CACHE_SIZE", "1024"))
+# Databases whose REPEATABLE READ reads the whole transaction from one snapshot
+SNAPSHOT_ISOLATION_DIALECTS = frozenset({"postgresql", "mysql"})
+
+_KEEP = frozenset(string.ascii_lowercase + string.digits)
+
+class _TokenTable(dict):
+    """
+    A str.translate table equivalent to re.sub(r'[^a-z0-9\s]', '', text):
+    ASCII letters, digits and whitespace are kept, everything else is deleted.
+    Code points are resolved on first sight, so non-ASCII text is handled too.
+    """
+    def __missing__(self, codepoint: int):
+        char = chr(codepoint)
+        value = char if char in _KEEP or char.isspace() else None
+        self[codepoint] = value
+        return value
+
+_TRANS = _TokenTable()
+for _codepoint in range(256):
+    _TRANS[_codepoint]
+
+def tokenize(text: str) -> List[str]:
+    """Simple tokenizer: lowercase and remove punctuation."""
+    return text.lower().translate(_TRANS).split()
+
+class BM25Index:
+    """
+    Okapi BM25 with the same parameters and scoring as rank_bm25's BM25Okapi,
+    stored as flat NumPy arrays instead of one term-frequency dict per document.
+    Postings are term-major in CSR layout: the documents containing term `t` are
+    `doc_ids[indptr[t]:indptr[t + 1]]`, and `weights` holds each posting's full
+    BM25 contribution (idf times saturated term frequency), computed at build time.
+    """
+
+    def __init__(self, corpus: List[List[str]], k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.corpus_size = len(corpus)
+
+        tokens = list(chain.from_iterable(corpus))
+        self.vocab = {term: i for i, term in enumerate(dict.fromkeys(tokens))}
+        term_ids = np.fromiter(map(self.vocab.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+        doc_len = np.fromiter(map(len, corpus), dtype=np.int64, count=self.corpus_size)
+        token_docs = np.repeat(np.arange(self.corpus_size, dtype=np.int64), doc_len)
+
+        # Count each (term, doc) pair once; sorting by term * N + doc yields term-major postings
+        pairs, tf = np.unique(term_ids * self.corpus_size + token_docs, return_counts=True)
+        posting_terms = pairs // self.corpus_size
+        self.doc_ids = (pairs % self.corpus_size).astype(np.int32)
+        doc_freqs = np.bincount(posting_terms, minlength=len(self.vocab))
+        self.indptr = np.concatenate(([0], np.cumsum(doc_freqs)))
+
+        # Same idf as BM25Okapi: negative values are floored to epsilon * mean idf
+        idf = np.log(self.corpus_size - doc_freqs + 0.5) - np.log(doc_freqs + 0.5)
+        if idf.size:
+            idf[idf < 0] = epsilon * idf.mean()
+
+        avgdl = doc_len.sum() / self.corpus_size if self.corpus_size else 0
+        length_norm = k1 * (1 - b + b * doc_len / (avgdl or 1))
+        self.weights = idf[posting_terms] * (tf * (k1 + 1) / (tf + length_norm[self.doc_ids]))
+
+    def get_scores(self, query: List[str]) -> np.ndarray:
+        """Returns the BM25 score of every document in the corpus for the query tokens."""
+        term_ids = [t for t in map(self.vocab.get, query) if t is not None]
+        if not term_ids:
+            return np.zeros(self.corpus_size)
+
+        # Gather the postings of every query term and sum them per document in one
+        # pass: a sparse matrix-vector product over the query's columns.
+        postings = np.concatenate([np.arange(self.indptr[t], self.indptr[t + 1]) for t in term_ids])
+        return np.bincount(self.doc_ids[postings], weights=self.weights[postings], minlength=self.corpus_size)
+
+class BM25Snapshot(NamedTuple):
+    """An immutable view of the index; searches never see a half-built one."""
+    documents: List[Dict] # [{"text": "...", "metadata": {...}}, ...]
+    tokens: List[List[str]] # Tokens of each document, kept so adds never re-tokenize
+    bm25: Optional[BM25Index]
+    by_doc: Dict[str, List[int]] # document_id -> positions of its chunks in `documents`
+    deleted: np.ndarray # Tombstones: True for chunks deleted since the last rebuild
+    n_deleted: int
 
 class BM25Service:
     """
     Manages the BM25 index for keyword-based search.
-    Persists the index and the corresponding documents to a pickle file.
+    Chunks and their tokens are persisted to the `chunks` table. Writes made by
+    this process update the in-memory index directly; changes made elsewhere
+    trigger a lazy rebuild from the table on the next search.
     """
-    
+
     def __init__(self):
-        self.bm25 = None
-        self.documents = [] # List of Dicts: [{"text": "...", "metadata": {...}}, ...]
-        self.load_index()
-
-    def load_index(self):
-        """Loads the BM25 index and documents from disk if they exist."""
-        if os.path.exists(BM25_INDEX_PATH):
-            try:
-                with open(BM25_INDEX_PATH, "rb") as f:
-                    data = pickle.load(f)
-                    self.documents = data.get("documents", [])
-                    corpus = [self._tokenize(doc["text"]) for doc in self.documents]
-                    if corpus:
-                        self.bm25 = BM25Okapi(corpus)
-                    print(f"Loaded BM25 index with {len(self.documents)} chunks.")
-            except Exception as e:
-                print(f"Failed to load BM25 index: {e}")
-                self.documents = []
-                self.bm25 = None
-
-    def save_index(self):
-        """Saves the current documents list to disk (rebuilds index on load)."""
+        self._snapshot: Optional[BM25Snapshot] = None
+        self._dirty = True # Nothing loaded yet, build on first search
+        self._lock = threading.Lock()
+        self._revision = None # Chunk table revision the current snapshot was built from
+        self._checked_at = 0.0
+        # LRU of (query, k) -> results, valid only for the snapshot it was filled from
+        self._search_cache: OrderedDict = OrderedDict()
+        self._search_cache_snapshot: Optional[BM25Snapshot] = None
+        self._search_cache_lock = threading.Lock()
+
+    def _rebuild(self):
+        """Streams the persisted chunk tokens from the database and rebuilds the BM25 index."""
+        # Clear the flag first so writes that land while we read are not lost
+        self._dirty = False
+        documents = []
+        tokenized_corpus = []
+        by_doc = defaultdict(list)
+        db = SessionLocal()
         try:
-            with open(BM25_INDEX_PATH, "wb") as f:
-                # We only save documents, we rebuild BM25 object on load/update
-                pickle.dump({"documents": self.documents}, f)
-            print("Saved BM25 index to disk.")
-        except Exception as e:
-            print(f"Failed to save BM25 index: {e}")
-
-    def add_documents(self, chunks: List[str], metadatas: List[Dict]):
-        """
-        Adds new documents to the index and rebuilds it.
-        NOTE: BM25 is an in-memory index. For large datasets, this is slow.
-        For this project scale, rebuilding is acceptable.
-        """
-        new_docs = [{"text": chunk, "metadata": meta} for chunk, meta in zip(chunks, metadatas)]
-        self.documents.extend(new_docs)
-        
-        # Rebuild index
-        tokenized_corpus = [self._tokenize(doc["text"]) for doc in self.documents]
-        self.bm25 = BM25Okapi(tokenized_corpus)
-        
-        self.save_index()
+            # Read the revision and the rows as of the same point in time
+            if engine.dialect.name in SNAPSHOT_ISOLATION_DIALECTS:
+                db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+            revision = self._read_revision(db)
+            rows = db.execute(
+                select(Chunk.document_id, Chunk.source_filename, Chunk.text, Chunk.tokens)
+                .execution_options(yield_per=1000)
+            )
+            for row in rows:
+                doc_id = str(row.document_id)
+                by_doc[doc_id].append(len(documents))
+                documents.append({
+                    "text": row.text,
+                    "metadata": {"document_id": doc_id, "source_filename": row.source_filename},
+                })
+                tokenized_corpus.append(row.tokens)
+            if self._read_revision(db) != revision:
+                # Without snapshot isolation a write landed mid-read; the rows match
+                # no single revision, so leave this snapshot to be rebuilt
+                revision = None
+                self._dirty = True
+            bm25 = BM25Index(tokenized_corpus) if tokenized_corpus else None
+        except BaseException:
+            # Nothing was published, so the next search must try again
+            self._dirty = True
+            raise
+        finally:
+            db.close()
 
-    def delete_documents(self, document_id: str):
+        # Publish the new snapshot with a single reference swap
+        self._snapshot = BM25Snapshot(documents, tokenized_corpus, bm25, dict(by_doc), np.zeros(len(documents), dtype=bool), 0)
+        self._revision = revision
+        print(f"Rebuilt BM25 index with {len(documents)} chunks.")
+
+    def _append(self, documents: List[Dict], tokens: List[List[str]]):
+        """
+        Adds freshly inserted chunks to the current index from their in-memory
+        tokens, instead of re-reading the whole chunks table.
+        """
+        snapshot = self._snapshot
+        offset = len(snapshot.documents)
+        by_doc = dict(snapshot.by_doc)
+        for position, doc in enumerate(documents, start=offset):
+            doc_id = doc["metadata"]["document_id"]
+            by_doc[doc_id] = by_doc.get(doc_id, []) + [position]
+        all_tokens = snapshot.tokens + tokens
+        self._snapshot = BM25Snapshot(
+            snapshot.documents + documents,
+            all_tokens,
+            BM25Index(all_tokens),
+            by_doc,
+            np.concatenate([snapshot.deleted, np.zeros(len(documents), dtype=bool)]),
+            snapshot.n_deleted,
+        )
+
+    def _apply_write(self, before: int, after: int, update):
+        """
+        Applies one of our own writes to the current snapshot via `update`,
+        provided the snapshot was built exactly from the table before the write.
+        A snapshot already at `after` was rebuilt with the write loaded, so it is
+        left alone; otherwise the table changed in other ways too, so rebuild.
+        """
+        with self._lock:
+            if self._snapshot is not None and self._revision == before:
+                update()
+                self._revision = after
+            elif self._snapshot is None or self._revision != after:
+                self._dirty = True
+
+    def _tombstone(self, document_id: str):
+        """
+        Hides a deleted document's chunks from search without rebuilding the index.
+        Term statistics keep counting them until the next rebuild, which is
+        scheduled once too large a share of the index is tombstoned.
         """
-        Removes all chunks associated with a specific document_id and rebuilds the index.
+        snapshot = self._snapshot
+        if snapshot is None or document_id not in snapshot.by_doc:
+            return
+        positions = snapshot.by_doc[document_id]
+        deleted = snapshot.deleted.copy()
+        deleted[positions] = True
+        by_doc = {doc_id: idxs for doc_id, idxs in snapshot.by_doc.items() if doc_id != document_id}
+        n_deleted = snapshot.n_deleted + len(positions)
+        self._snapshot = snapshot._replace(by_doc=by_doc, deleted=deleted, n_deleted=n_deleted)
+        if n_deleted > TOMBSTONE_REBUILD_FRACTION * len(snapshot.documents):
+            self._dirty = True
+
+    def _read_revision(self, db) -> int:
+        """The chunks table's revision, which every write to it increments."""
+        return db.execute(select(ChunkRevision.revision).where(ChunkRevision.id == 1)).scalar() or 0
+
+    def _bump_revision(self, db) -> int:
+        """
+        Increments the revision in the caller's transaction and returns the new
+        value. The row stays locked until commit, so concurrent writers are
+        serialized and each sees the revision directly before its own write.
+        """
+        revision = db.execute(
+            update(ChunkRevision)
+            .where(ChunkRevision.id == 1)
+            .values(revision=ChunkRevision.revision + 1)
+            .returning(ChunkRevision.revision)
+        ).scalar()
+        if revision is None:
+            # The row is created by its migration, but not by a bare create_all
+            db.execute(insert(ChunkRevision).values(id=1, revision=1))
+            revision = 1
+        return revision
+
+    def _check_for_updates(self):
+        """
+        Marks the index dirty when the chunks table changed behind our back, e.g.
+        when the ingestion worker process added a document. Throttled to one
+        query per BM25_REFRESH_INTERVAL.
         """
-        initial_count = len(self.documents)
-        # Filter out documents matching the ID
-        self.documents = [
-            doc for doc in self.documents 
-            if doc["metadata"].get("document_id") != document_id
+        now = time.monotonic()
+        if self._dirty or now - self._checked_at < BM25_REFRESH_INTERVAL:
+            return
+        self._checked_at = now
+        db = SessionLocal()
+        try:
+            revision = self._read_revision(db)
+        finally:
+            db.close()
+        if revision != self._revision:
+            self._dirty = True
+
+    def _current_snapshot(self) -> BM25Snapshot:
+        """
+        Returns the latest snapshot, rebuilding it first if the index is dirty.
+        Only one thread rebuilds at a time; while it does, other searches keep
+        using the previous snapshot rather than waiting (except on first load).
+        """
+        self._check_for_updates()
+        if self._dirty or self._snapshot is None:
+            if self._lock.acquire(blocking=self._snapshot is None):
+                try:
+                    if self._dirty or self._snapshot is None:
+                        self._rebuild()
+                finally:
+                    self._lock.release()
+        return self._snapshot
+
+    def warm(self):
+        """Builds the index now, so the first search doesn't pay for it."""
+        self._current_snapshot()
+
+    def add_documents(self, chunks: List[str], metadatas: List[Dict], pretokenized: Optional[List[List[str]]] = None):
+        """
+        Persists new chunks with a single bulk INSERT. Each chunk is tokenized
+        exactly once: here, or by the caller with `tokenize` and passed in as
+        `pretokenized`. The index is extended from those tokens.
+        """
+        tokens = pretokenized if pretokenized is not None else [tokenize(chunk) for chunk in chunks]
+        rows = [
+            {
+                "document_id": uuid.UUID(meta["document_id"]),
+                "source_filename": meta.get("source_filename"),
+                "text": chunk,
+                "tokens": chunk_tokens,
+            }
+            for chunk, meta, chunk_tokens in zip(chunks, metadatas, tokens)
+        ]
+        if not rows:
+            return
+
+        db = SessionLocal()
+        try:
+            db.execute(insert(Chunk), rows)
+            after = self._bump_revision(db)
+            db.commit()
+        finally:
+            db.close()
+
+        documents = [
+            {"text": row["text"], "metadata": {"document_id": str(row["document_id"]), "source_filename": row["source_filename"]}}
+            for row in rows
         ]
-        
-        if len(self.documents) < initial_count:
-            print(f"Removed {initial_count - len(self.documents)} chunks from BM25 index for doc {document_id}.")
-            
-            # Rebuild index
-            if self.documents:
-                tokenized_corpus = [self._tokenize(doc["text"]) for doc in self.documents]
-                self.bm25 = BM25Okapi(tokenized_corpus)
-            else:
-                self.bm25 = None
-                
-            self.save_index()
-        else:
+        self._apply_write(after - 1, after, lambda: self._append(documents, tokens))
+        print(f"Added {len(rows)} chunks to BM25 index.")
+
+    def delete_documents(self, document_id: str):
+        """
+        Removes all chunks associated with a specific document_id. The chunks are
+        tombstoned in the current index rather than triggering a full rebuild.
+        """
+        db = SessionLocal()
+        try:
+            result = db.execute(delete(Chunk).where(Chunk.document_id == uuid.UUID(document_id)))
+            if result.rowcount:
+                after = self._bump_revision(db)
+            db.commit()
+        finally:
+            db.close()
+
+        if not result.rowcount:
             print(f"No chunks found in BM25 index for doc {document_id}.")
+            return
+
+        print(f"Removed {result.rowcount} chunks from BM25 index for doc {document_id}.")
+        self._apply_write(after - 1, after, lambda: self._tombstone(document_id))
 
     def search(self, query: str, k: int = 5) -> List[Dict]:
         """
         Performs keyword search using BM25.
         Returns a list of documents with scores.
         """
-        if not self.bm25:
+        snapshot = self._current_snapshot()
+        if not snapshot.bm25:
             return []
 
-        tokenized_query = self._tokenize(query)
-        # get_scores returns a list of scores for every document in the corpus
-        scores = self.bm25.get_scores(tokenized_query)
-        
-        # Pair scores with documents
-        scored_docs = []
-        for i, score in enumerate(scores):
-            if score > 0: # Filter out zero relevance
-                scored_docs.append({
-                    "document": self.documents[i],
-                    "score": score
-                })
-        
-        # Sort by score desc and take top k
-        scored_docs.sort(key=lambda x: x["score"], reverse=True)
-        return scored_docs[:k]
-
-    def _tokenize(self, text: str) -> List[str]:
-        """Simple tokenizer: lowercase and remove punctuation."""
-        text = text.lower()
-        # Remove special characters
-        text = re.sub(r'[^a-z0-9\s]', '', text)
-        return text.split()
+        key = (query, k)
+        with self._search_cache_lock:
+            # Every write publishes a new snapshot, which invalidates the cache
+            if self._search_cache_snapshot is not snapshot:
+                self._search_cache.clear()
+                self._search_cache_snapshot = snapshot
+            results = self._search_cache.get(key)
+            if results is not None:
+                self._search_cache.move_to_end(key)
+                return list(results)
+
+        results = self._score(snapshot, query, k)
+
+        with self._search_cache_lock:
+            if self._search_cache_snapshot is snapshot:
+                self._search_cache[key] = results
+                if len(self._search_cache) > SEARCH_CACHE_SIZE:
+                    self._search_cache.popitem(last=False)
+        return list(results)
+
+    def _score(self, snapshot: BM25Snapshot, query: str, k: int) -> List[Dict]:
+        """Scores the query against a snapshot and returns its top k live hits."""
+        tokenized_query = tokenize(query)
+        # get_scores returns an array with a score for every document in the corpus
+        scores = snapshot.bm25.get_scores(tokenized_query)
+
+        # Keep only relevant, live documents, then select the top k without a full sort
+        relevant = scores > 0
+        if snapshot.n_deleted:
+            relevant &= ~snapshot.deleted
+        hits = np.flatnonzero(relevant)
+        if hits.size > k:
+            hits = hits[np.argpartition(scores[hits], -k)[-k:]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [{"document": snapshot.documents[i], "score": float(scores[i])} for i in hits]
 
 # Singleton instance
 bm25_service = BM25Service()
@@ -1,25 +1,69 @@
 # backend/app/services/ingestion.py
 import os
-import uuid
 import re
-from urllib.parse import urlparse, parse_qs
-from pypdf import PdfReader
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor, wait as wait_futures
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from operator import attrgetter
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
 from fastapi import Depends
-from qdrant_client import QdrantClient, models as qdrant_models
+import numpy as np
+from qdrant_client import AsyncQdrantClient, models as qdrant_models
 from youtube_transcript_api import YouTubeTranscriptApi
 import trafilatura
+from trafilatura.settings import use_config
 
 from app.db.models import Document, DocumentStatus, SourceType
 from app.db.database import get_db, SessionLocal
-from app.utils.embeddings import get_embedding_model, EmbeddingModel
-from app.services.bm25 import get_bm25_service
+from app.db.qdrant import QDRANT_COLLECTION_NAME, ensure_qdrant_collection_exists, get_async_qdrant_client
+from app.utils.embeddings import get_embedding_model, EmbeddingModel, EMBEDDING_BATCH_SIZE, EMBEDDING_CONCURRENCY
+from app.utils.pdf import iter_pdf_text
+from app.services.bm25 import get_bm25_service, tokenize
 
-# --- Qdrant Configuration ---
-QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-QDRANT_COLLECTION_NAME = "knowledge_base"
+# Number of Qdrant upserts a document keeps in flight at once
+QDRANT_UPLOAD_PARALLEL = int(os.getenv("QDRANT_UPLOAD_PARALLEL", "2"))
+# Slices buffered between pipeline stages; bounds memory when a stage falls behind
+PIPELINE_QUEUE_SIZE = 2
+
+# Web pages are fetched over trafilatura's shared connection pool; give up on
+# slow sites after this many seconds instead of the library's 30
+WEB_FETCH_TIMEOUT = os.getenv("WEB_FETCH_TIMEOUT", "15")
+_TRAFILATURA_CONFIG = use_config()
+_TRAFILATURA_CONFIG.set("DEFAULT", "DOWNLOAD_TIMEOUT", WEB_FETCH_TIMEOUT)
+
+# Video id of a youtube.com watch URL (?v=...) or a youtu.be short link, on any subdomain
+_YOUTUBE_ID_RE = re.compile(r"^(?:https?://)?(?:[\w-]+\.)*(?:youtube\.com/[^?#]*\?(?:[^#]*&)?v=|youtu\.be/)([\w-]{11})")
+# One client for all transcripts, so fetches reuse its HTTP session and connections
+_YOUTUBE_API = YouTubeTranscriptApi()
+
+# The splitter is stateless, so one instance is shared by every document
+_SPLITTER = RecursiveCharacterTextSplitter(
+    chunk_size=500,
+    chunk_overlap=50,
+    length_function=len,
+    is_separator_regex=False,
+)
+
+
+def _point_ids(n: int) -> List[str]:
+    """
+    Random version-4 UUIDs in the simple 32-hex-digit form Qdrant accepts, drawn
+    from a single os.urandom call instead of one system call per uuid.uuid4().
+    """
+    raw = np.frombuffer(os.urandom(16 * n), dtype=np.uint8).reshape(n, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40 # version 4
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80 # RFC 4122 variant
+    digits = raw.tobytes().hex()
+    return [digits[i:i + 32] for i in range(0, 32 * n, 32)]
+
+
+def _chunk_payloads(chunks: List[str], doc_id: str, filename: str) -> List[Dict]:
+    """Builds each chunk's payload by copying one prebuilt dict of the per-document fields."""
+    base = {"document_id": doc_id, "source_filename": filename}
+    return [dict(base, text=chunk) for chunk in chunks]
 
 
 class IngestionService:
@@ -28,51 +72,17 @@ class IngestionService:
     text in the vector database.
     """
 
-    def __init__(self, db: Session, embedding_model: EmbeddingModel):
+    def __init__(self, db: Session, embedding_model: EmbeddingModel, qdrant_client: AsyncQdrantClient):
         self.db = db
         self.embedding_model = embedding_model
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
-            chunk_overlap=50,
-            length_function=len,
-            is_separator_regex=False,
-        )
-        self.qdrant_client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
-        self._ensure_qdrant_collection_exists()
-
-    def _ensure_qdrant_collection_exists(self):
-        try:
-            collection_info = self.qdrant_client.get_collection(collection_name=QDRANT_COLLECTION_NAME)
-            # Check if vector size matches Gemini's 768
-            if collection_info.config.params.vectors.size != 768:
-                print(f"Collection '{QDRANT_COLLECTION_NAME}' has incorrect vector size. Recreating...")
-                self.qdrant_client.delete_collection(collection_name=QDRANT_COLLECTION_NAME)
-                raise Exception("Collection deleted to force recreation.")
-        except Exception:
-            self.qdrant_client.create_collection(
-                collection_name=QDRANT_COLLECTION_NAME,
-                vectors_config=qdrant_models.VectorParams(size=768, distance=qdrant_models.Distance.COSINE),
-            )
-
-    def _extract_text_from_pdf(self, file_path: str) -> str:
-        text = ""
-        with open(file_path, "rb") as f:
-            reader = PdfReader(f)
-            for page in reader.pages:
-                text += page.extract_text() or ""
-        return text
+        self.qdrant_client = qdrant_client
 
     def _extract_text_from_youtube(self, video_url: str) -> str:
-        parsed_url = urlparse(video_url)
-        if "youtube.com" in parsed_url.netloc:
-            query_params = parse_qs(parsed_url.query)
-            video_id = query_params["v"][0]
-        elif "youtu.be" in parsed_url.netloc:
-            video_id = parsed_url.path[1:]
-        else:
+        match = _YOUTUBE_ID_RE.match(video_url)
+        if not match:
             raise ValueError("Not a valid YouTube URL.")
-        transcript_list = YouTubeTranscriptApi().fetch(video_id)
-        return " ".join([item.text for item in transcript_list])
+        transcript_list = _YOUTUBE_API.fetch(match.group(1))
+        return " ".join(map(attrgetter("text"), transcript_list))
 
     def _extract_text_from_web(self, url: str) -> str:
         """
@@ -81,7 +91,7 @@ class IngestionService:
         """
         print(f"Scraping text from web page: {url}")
         try:
-            downloaded = trafilatura.fetch_url(url)
+            downloaded = trafilatura.fetch_url(url, config=_TRAFILATURA_CONFIG)
             if not downloaded:
                 raise ValueError("Failed to fetch URL content.")
             
@@ -89,7 +99,8 @@ class IngestionService:
                 downloaded,
                 include_tables=True,
                 include_comments=False,
-                output_format='markdown'
+                output_format='markdown',
+                config=_TRAFILATURA_CONFIG
             )
             
             if not text:
@@ -101,55 +112,196 @@ class IngestionService:
             print(f"Error scraping {url}: {e}")
             return ""
 
-    def process_document(self, document_id: str):
-        document = self.db.query(Document).filter(Document.id == document_id).first()
-        if not document:
+    def _split_stream(self, texts: Iterable[str]) -> Iterator[str]:
+        """
+        Splits a stream of text pieces (e.g. PDF pages) into chunks without joining
+        them into one string. The last chunk of each piece may be cut short by the
+        piece boundary, so it is carried over and re-split with the next piece.
+        Pieces are joined with a newline, as if the pages had been "\n".join-ed.
+        """
+        tail = ""
+        for text in texts:
+            # split_text strips the tail, so restore the break between the pieces
+            chunks = _SPLITTER.split_text(f"{tail}\n{text}" if tail else text)
+            tail = chunks.pop() if chunks else ""
+            yield from chunks
+        if tail:
+            yield tail
+
+    def _iter_chunks(self, document) -> Iterator[str]:
+        """Extracts the document's text and yields it as chunks."""
+        if document.source_type == SourceType.pdf:
+            yield from self._split_stream(iter_pdf_text(document.saved_file_path))
             return
 
+        text = ""
+        if document.source_type == SourceType.youtube:
+            text = self._extract_text_from_youtube(document.source_url)
+        elif document.source_type == SourceType.web:
+            text = self._extract_text_from_web(document.source_url)
+        yield from _SPLITTER.split_text(text)
+
+    def _embed_slice(self, batch_chunks: List[str]) -> Tuple[np.ndarray, List[List[str]]]:
+        """Embeds a slice of chunks and tokenizes it for BM25. Runs in a worker thread."""
+        return self.embedding_model.encode_documents(batch_chunks), [tokenize(chunk) for chunk in batch_chunks]
+
+    async def _run_pipeline(self, document, chunks: List[str], payloads: List[Dict], tokens: List[List[str]]):
+        """
+        Streams a document through three overlapped stages connected by bounded queues:
+        extract and split -> embed -> upsert to Qdrant. Wall-clock time approaches that
+        of the slowest stage rather than the sum of all three. Each chunk, its payload
+        and its BM25 tokens are appended to `chunks`, `payloads` and `tokens`.
+        """
+        doc_id = str(document.id)
+        filename = document.filename
+        chunk_iter = self._iter_chunks(document)
+        # Slices large enough to keep every concurrent embedding request busy
+        slice_size = EMBEDDING_BATCH_SIZE * EMBEDDING_CONCURRENCY
+        extracted = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        embedded = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        loop = asyncio.get_running_loop()
+        # The document's final batch, held back from the upload stage (see below)
+        last_points = None
+        # The chunk generator holds the open PDF, so it always runs on the same single thread
+        extractor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="extract")
+        extracting: Optional[Future] = None # The slice the extractor is working on
+
+        async def extract():
+            nonlocal extracting
+            # Chunks are pulled lazily, so a PDF is only read as far as needed
+            while True:
+                extracting = extractor.submit(lambda: list(islice(chunk_iter, slice_size)))
+                if not (batch_chunks := await asyncio.wrap_future(extracting)):
+                    break
+                await extracted.put(batch_chunks)
+            await extracted.put(None)
+
+        def close_chunks():
+            # A generator can't be closed while a slice is being pulled from it
+            if extracting is not None:
+                wait_futures([extracting])
+            chunk_iter.close()
+
+        async def embed():
+            nonlocal last_points
+            while (batch_chunks := await extracted.get()) is not None:
+                batch_embeddings, batch_tokens = await asyncio.to_thread(self._embed_slice, batch_chunks)
+
+                # Prepare payloads for Qdrant and metadata for BM25
+                batch_payloads = _chunk_payloads(batch_chunks, doc_id, filename)
+                chunks.extend(batch_chunks)
+                payloads.extend(batch_payloads)
+                tokens.extend(batch_tokens)
+
+                if last_points is not None:
+                    await embedded.put(last_points)
+                last_points = qdrant_models.Batch(
+                    ids=_point_ids(len(batch_chunks)),
+                    vectors=batch_embeddings,
+                    payloads=batch_payloads,
+                )
+            for _ in range(QDRANT_UPLOAD_PARALLEL):
+                await embedded.put(None)
+
+        async def upload():
+            while (points := await embedded.get()) is not None:
+                await self.qdrant_client.upsert(collection_name=QDRANT_COLLECTION_NAME, points=points, wait=False)
+
         try:
-            text = ""
-            if document.source_type == SourceType.pdf:
-                text = self._extract_text_from_pdf(document.saved_file_path)
-            elif document.source_type == SourceType.youtube:
-                text = self._extract_text_from_youtube(document.source_url)
-            elif document.source_type == SourceType.web:
-                text = self._extract_text_from_web(document.source_url)
-            
-            if not text:
-                raise ValueError("Text extraction failed or returned no content.")
+            async with asyncio.TaskGroup() as stages:
+                stages.create_task(extract())
+                stages.create_task(embed())
+                for _ in range(QDRANT_UPLOAD_PARALLEL):
+                    stages.create_task(upload())
+        except ExceptionGroup as e:
+            # The first failing stage cancels the others; report its error
+            raise e.exceptions[0]
+        finally:
+            # Don't hold up the event loop when a stage failed while a slice was still
+            # being extracted: close the generator, and the PDF, off the loop instead
+            extractor.shutdown(wait=False, cancel_futures=True)
+            loop.run_in_executor(None, close_chunks)
 
-            chunks = self.text_splitter.split_text(text)
-            embeddings = self.embedding_model.encode_documents(chunks)
+        # The other upserts return once Qdrant has accepted them, not applied them.
+        # Qdrant applies a collection's updates in order, so waiting on the last one
+        # means the whole document is searchable before it is marked completed.
+        if last_points is not None:
+            await self.qdrant_client.upsert(collection_name=QDRANT_COLLECTION_NAME, points=last_points, wait=True)
 
-            # Prepare payloads for Qdrant and metadata for BM25
-            payloads = [{"text": chunk, "document_id": str(document.id), "source_filename": document.filename} for chunk in chunks]
+    def _load_document(self, document_id: str):
+        # Only fetch the columns ingestion needs rather than a full mapped object
+        return self.db.execute(
+            select(Document.id, Document.filename, Document.source_type, Document.source_url, Document.saved_file_path)
+            .where(Document.id == document_id)
+        ).one_or_none()
 
-            self.qdrant_client.upsert(
-                collection_name=QDRANT_COLLECTION_NAME,
-                points=qdrant_models.Batch(
-                    ids=[str(uuid.uuid4()) for _ in chunks],
-                    vectors=embeddings,
-                    payloads=payloads
-                ),
-                wait=True
-            )
+    async def process_document(self, document_id: str):
+        document = await asyncio.to_thread(self._load_document, document_id)
+        if not document:
+            return
+
+        try:
+            chunks = []
+            payloads = []
+            tokens = []
+            await self._run_pipeline(document, chunks, payloads, tokens)
+
+            if not chunks:
+                raise ValueError("Text extraction failed or returned no content.")
 
             # Update BM25 Index
             print("Updating BM25 index...")
             bm25_service = get_bm25_service()
-            bm25_service.add_documents(chunks, payloads)
+            await asyncio.to_thread(bm25_service.add_documents, chunks, payloads, pretokenized=tokens)
             
-            document.chunk_count = len(chunks)
-            document.status = DocumentStatus.completed
-            self.db.commit()
+            await asyncio.to_thread(self._set_status, document.id, DocumentStatus.completed, chunk_count=len(chunks))
             print(f"Successfully processed document {document.id}.")
 
-        except Exception as e:
-            document.status = DocumentStatus.failed
-            self.db.commit()
-            print(f"An error occurred during document processing for {document.id}: {e}")
+        except BaseException as e:
+            # Also reached when the job is cancelled (e.g. the worker's job_timeout or
+            # a shutdown), so a half-ingested document never stays `processing`
+            await asyncio.to_thread(self._fail, document.id)
+            print(f"An error occurred during document processing for {document.id}: {e!r}")
+            # Chunks stored before the failure would otherwise keep matching searches
+            try:
+                await self._delete_vectors(str(document.id))
+            except Exception as cleanup_error:
+                print(f"Error removing vectors of failed document {document.id}: {cleanup_error}")
+            try:
+                await asyncio.to_thread(get_bm25_service().delete_documents, str(document.id))
+            except Exception as cleanup_error:
+                print(f"Error removing keyword chunks of failed document {document.id}: {cleanup_error}")
+            if not isinstance(e, Exception):
+                raise
+
+    def _fail(self, document_id):
+        self.db.rollback()
+        self._set_status(document_id, DocumentStatus.failed)
 
-    def delete_document(self, document_id: str):
+    def _set_status(self, document_id, status: DocumentStatus, **values):
+        """Writes a status transition with a single UPDATE statement."""
+        self.db.execute(
+            update(Document).where(Document.id == document_id).values(status=status, **values)
+        )
+        self.db.commit()
+
+    async def _delete_vectors(self, document_id: str):
+        """Deletes every Qdrant point whose payload belongs to the document."""
+        await self.qdrant_client.delete(
+            collection_name=QDRANT_COLLECTION_NAME,
+            points_selector=qdrant_models.FilterSelector(
+                filter=qdrant_models.Filter(
+                    must=[
+                        qdrant_models.FieldCondition(
+                            key="document_id",
+                            match=qdrant_models.MatchValue(value=document_id),
+                        )
+                    ]
+                )
+            ),
+        )
+
+    async def delete_document(self, document_id: str):
         """
         Deletes a document's vectors from Qdrant and removes it from the BM25 index.
         """
@@ -157,19 +309,7 @@ class IngestionService:
         
         # 1. Delete from Qdrant using Filter
         try:
-            self.qdrant_client.delete(
-                collection_name=QDRANT_COLLECTION_NAME,
-                points_selector=qdrant_models.FilterSelector(
-                    filter=qdrant_models.Filter(
-                        must=[
-                            qdrant_models.FieldCondition(
-                                key="document_id",
-                                match=qdrant_models.MatchValue(value=document_id),
-                            )
-                        ]
-                    )
-                ),
-            )
+            await self._delete_vectors(document_id)
             print("Deleted vectors from Qdrant.")
         except Exception as e:
             print(f"Error deleting from Qdrant: {e}")
@@ -178,28 +318,30 @@ class IngestionService:
         print(f"Deleting document {document_id} from BM25 index...")
         try:
             bm25_service = get_bm25_service()
-            bm25_service.delete_documents(document_id)
+            await asyncio.to_thread(bm25_service.delete_documents, document_id)
         except Exception as e:
             print(f"Error deleting from BM25: {e}")
 
 
 # --- Standalone Background Tasks ---
-def process_document_task(document_id: str):
+async def process_document_task(document_id: str):
+    # A no-op after the startup check; kept so the in-process fallback still gets a collection
+    await asyncio.to_thread(ensure_qdrant_collection_exists)
     db = SessionLocal()
     try:
         embedding_model = get_embedding_model()
-        service = IngestionService(db, embedding_model)
-        service.process_document(document_id)
+        service = IngestionService(db, embedding_model, get_async_qdrant_client())
+        await service.process_document(document_id)
     finally:
         db.close()
 
-def delete_document_task(document_id: str):
+async def delete_document_task(document_id: str):
     db = SessionLocal()
     try:
         # We don't strictly need the embedding model for deletion, but the service requires it in init
         # Ideally we'd refactor IngestionService to not require it for deletion, but this works for now.
         embedding_model = get_embedding_model()
-        service = IngestionService(db, embedding_model)
-        service.delete_document(document_id)
+        service = IngestionService(db, embedding_model, get_async_qdrant_client())
+        await service.delete_document(document_id)
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
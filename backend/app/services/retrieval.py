@@ -1,17 +1,32 @@
 # backend/app/services/retrieval.py
 
-import os
-from qdrant_client import QdrantClient, models
-from typing import List, AsyncGenerator, Dict
+import asyncio
+import numpy as np
+from qdrant_client import AsyncQdrantClient, models
+from typing import List, AsyncGenerator, Dict, Tuple
 from fastapi import Depends
 
+from app.db.qdrant import QDRANT_COLLECTION_NAME, get_async_qdrant_client
 from app.utils.embeddings import get_embedding_model, EmbeddingModel
 from app.services.llm import get_llm_provider, LLMProvider
 from app.services.bm25 import get_bm25_service, BM25Service
 
-QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-QDRANT_COLLECTION_NAME = "knowledge_base"
+# Search the int8-quantized vectors, fetching 2x the limit and rescoring those
+# candidates with the original vectors to recover full-precision ranking
+QDRANT_SEARCH_PARAMS = models.SearchParams(
+    quantization=models.QuantizationSearchParams(rescore=True, oversampling=2.0),
+)
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+def _split_template(template: str) -> Tuple[str, str, str]:
+    """
+    Splits a prompt template around its {context} and {question} fields once, so
+    building a prompt is a single join instead of parsing the template per request.
+    """
+    head, rest = template.split("{context}")
+    middle, tail = rest.split("{question}")
+    return head, middle, tail
 
 class RetrievalService:
     """
@@ -45,64 +60,86 @@ Question:
 {question}
 """
 
-    def __init__(self, embedding_model: EmbeddingModel, llm_provider: LLMProvider, bm25_service: BM25Service):
+    _STRICT_PROMPT_PARTS = _split_template(STRICT_PROMPT_TEMPLATE)
+    _HYBRID_PROMPT_PARTS = _split_template(HYBRID_PROMPT_TEMPLATE)
+
+    def __init__(self, embedding_model: EmbeddingModel, llm_provider: LLMProvider, bm25_service: BM25Service, qdrant_client: AsyncQdrantClient):
         self.embedding_model = embedding_model
         self.llm_provider = llm_provider
         self.bm25_service = bm25_service
-        self.qdrant_client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+        self.qdrant_client = qdrant_client
 
-    def _reciprocal_rank_fusion(self, vector_results: List[models.ScoredPoint], keyword_results: List[Dict], k: int = 60) -> List[Dict]:
+    def _reciprocal_rank_fusion(self, vector_results: List[models.ScoredPoint], keyword_results: List[Dict], k: int = 60, top_n: int = 5) -> List[Dict]:
         """
         Combines vector and keyword search results using Reciprocal Rank Fusion (RRF).
         Returns a list of payloads (dicts) sorted by RRF score.
         """
-        scores = {} # {doc_id: score}
-        doc_map = {} # {doc_id: payload}
+        slots = {} # {unique_key: slot in scores}
+        doc_map = [] # payload of each slot
+        slot_ids = [] # slot of every ranked result, vector results first
+        ranks = [] # rank of every ranked result within its own list
 
         # Process Vector Results
         for rank, point in enumerate(vector_results):
             # Ensure payload exists
             if not point.payload: continue
-            doc_id = point.payload.get("document_id")
             # Use chunk text as unique key if ID not sufficient, but ID should be chunk ID in future
             # For now, we rely on payload['text'] as unique identifier if doc_id is just parent doc
             # Let's assume text is unique enough for this MVP fusion
-            unique_key = point.payload['text'] 
-            
-            if unique_key not in scores:
-                scores[unique_key] = 0
-                doc_map[unique_key] = point.payload
-            
-            scores[unique_key] += 1 / (k + rank + 1)
+            unique_key = point.payload['text']
+            if unique_key not in slots:
+                slots[unique_key] = len(doc_map)
+                doc_map.append(point.payload)
+            slot_ids.append(slots[unique_key])
+            ranks.append(rank)
 
         # Process Keyword Results
         for rank, item in enumerate(keyword_results):
             unique_key = item["document"]["text"]
-            
-            if unique_key not in scores:
-                scores[unique_key] = 0
-                doc_map[unique_key] = item["document"] # Normalized to match payload structure
-            
-            scores[unique_key] += 1 / (k + rank + 1)
-
-        # Sort by score
-        sorted_keys = sorted(scores.keys(), key=lambda x: scores[x], reverse=True)
-        
-        # Return top 5 fused results
-        return [doc_map[key] for key in sorted_keys[:5]]
-
-    def _retrieve_relevant_chunks(self, query: str) -> List[Dict]:
-        # 1. Vector Search
-        query_embedding = self.embedding_model.encode_query(query)
-        vector_results = self.qdrant_client.query_points(
+            if unique_key not in slots:
+                slots[unique_key] = len(doc_map)
+                doc_map.append(item["document"]) # Normalized to match payload structure
+            slot_ids.append(slots[unique_key])
+            ranks.append(rank)
+
+        if not doc_map:
+            return []
+
+        # Accumulate every result's 1 / (k + rank + 1) into its slot in one pass
+        scores = np.zeros(len(doc_map))
+        np.add.at(scores, np.asarray(slot_ids), 1.0 / (k + np.asarray(ranks) + 1))
+
+        # Select the top n without a full sort. Everything tied with the n-th score
+        # is kept as a candidate so ties still go to the first-seen result.
+        candidates = np.arange(len(doc_map))
+        if len(doc_map) > top_n:
+            threshold = np.partition(scores, -top_n)[-top_n]
+            candidates = np.flatnonzero(scores >= threshold)
+        order = candidates[np.lexsort((candidates, -scores[candidates]))][:top_n]
+
+        # Return the top n fused results
+        return [doc_map[slot] for slot in order]
+
+    async def _vector_search(self, query: str) -> List[models.ScoredPoint]:
+        query_embedding = await asyncio.to_thread(self.embedding_model.encode_query, query)
+        # The async gRPC client leaves the event loop free during the round trip
+        response = await self.qdrant_client.query_points(
             collection_name=QDRANT_COLLECTION_NAME,
             query=query_embedding,
             limit=10, # Fetch more for fusion
+            search_params=QDRANT_SEARCH_PARAMS,
             with_payload=True,
-        ).points
-        
-        # 2. Keyword Search
-        keyword_results = self.bm25_service.search(query, k=10)
+        )
+        return response.points
+
+    async def _retrieve_relevant_chunks(self, query: str) -> List[Dict]:
+        # 1. Vector Search and 2. Keyword Search, run concurrently. BM25 doesn't
+        # need the query embedding, so it overlaps with both the embedding call
+        # and the Qdrant search.
+        vector_results, keyword_results = await asyncio.gather(
+            self._vector_search(query),
+            asyncio.to_thread(self.bm25_service.search, query, k=10),
+        )
         
         # 3. Fusion
         fused_results = self._reciprocal_rank_fusion(vector_results, keyword_results)
@@ -111,20 +148,21 @@ Question:
 
     async def generate_response(self, query: str, enhance_with_ai: bool = False) -> AsyncGenerator[str, None]:
         print(f"Retrieving chunks for query: '{query}'")
-        relevant_chunks = self._retrieve_relevant_chunks(query)
+        relevant_chunks = await self._retrieve_relevant_chunks(query)
         
         if not relevant_chunks:
             yield "I could not find any relevant information in the uploaded documents to answer your question."
             return
 
-        context_str = "\n\n---\n\n".join([chunk['text'] for chunk in relevant_chunks])
+        context_str = CONTEXT_SEPARATOR.join([chunk['text'] for chunk in relevant_chunks])
         
         if enhance_with_ai:
             print("Using HYBRID prompt template.")
-            prompt = self.HYBRID_PROMPT_TEMPLATE.format(context=context_str, question=query)
+            head, middle, tail = self._HYBRID_PROMPT_PARTS
         else:
             print("Using STRICT prompt template.")
-            prompt = self.STRICT_PROMPT_TEMPLATE.format(context=context_str, question=query)
+            head, middle, tail = self._STRICT_PROMPT_PARTS
+        prompt = "".join((head, context_str, middle, query, tail))
             
         async for chunk in self.llm_provider.generate(prompt):
             yield chunk
@@ -134,5 +172,7 @@ def get_retrieval_service(
     embedding_model: EmbeddingModel = Depends(get_embedding_model),
     llm_provider: LLMProvider = Depends(get_llm_provider),
     bm25_service: BM25Service = Depends(get_bm25_service),
+    qdrant_client: AsyncQdrantClient = Depends(get_async_qdrant_client),
 ) -> RetrievalService:
-    return RetrievalService(embedding_model, llm_provider, bm25_service)
+    """Dependency to create a RetrievalService instance."""
+    return RetrievalService(embedding_model, llm_provider, bm25_service, qdrant_client)
@@ -0,0 +1,51 @@
+# backend/app/services/task_queue.py
+
+import os
+from typing import Optional
+from arq import create_pool, ArqRedis
+from arq.connections import RedisSettings
+from fastapi import BackgroundTasks, Request
+
+from app.services.ingestion import process_document_task
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+
+async def create_task_queue() -> Optional[ArqRedis]:
+    """
+    Connects to the ARQ Redis queue used to hand ingestion off to the worker process.
+    Returns None when REDIS_URL is not configured or Redis is unreachable, in which
+    case ingestion falls back to running in-process as a background task.
+    """
+    if not REDIS_URL:
+        print("REDIS_URL is not set. Documents will be processed in-process.")
+        return None
+    try:
+        pool = await create_pool(RedisSettings.from_dsn(REDIS_URL))
+        print("Connected to the ingestion task queue.")
+        return pool
+    except Exception as e:
+        print(f"Could not connect to the ingestion task queue: {e}. Documents will be processed in-process.")
+        return None
+
+
+def get_task_queue(request: Request) -> Optional[ArqRedis]:
+    """
+    Dependency function to get the ARQ pool created on app startup.
+    """
+    return getattr(request.app.state, "task_queue", None)
+
+
+async def enqueue_document_processing(
+    document_id,
+    background_tasks: BackgroundTasks,
+    task_queue: Optional[ArqRedis],
+):
+    """
+    Queues a document for ingestion on the worker, or on this process when no queue is available.
+    """
+    if task_queue is not None:
+        # The document id doubles as the job id, so a document is never queued twice
+        await task_queue.enqueue_job("process_document_task", str(document_id), _job_id=str(document_id))
+    else:
+        background_tasks.add_task(process_document_task, document_id)
@@ -1,12 +1,27 @@
 # backend/app/utils/embeddings.py
 
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import google.generativeai as genai
+from google.api_core.exceptions import ResourceExhausted
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
 from typing import List
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Texts sent per embed_content request. Gemini accepts at most 100 per batch.
+EMBEDDING_BATCH_SIZE = min(int(os.getenv("EMBEDDING_BATCH_SIZE", "100")), 100)
+# Batch requests in flight at once, shared by every caller in the process
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "5"))
+# Output size of text-embedding-004
+EMBEDDING_DIMENSION = 768
+# Number of recent query embeddings kept in memory
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+
 class EmbeddingModel:
     """
     A wrapper class for the Gemini Embedding API.
@@ -18,13 +33,22 @@ class EmbeddingModel:
             raise ValueError("GEMINI_API_KEY is not set in environment variables.")
         genai.configure(api_key=api_key)
         self.model_name = "models/text-embedding-004"
+        # LRU of query text -> embedding, so repeated queries skip the API call
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        self._batch_pool = ThreadPoolExecutor(max_workers=EMBEDDING_CONCURRENCY, thread_name_prefix="embed")
 
-    def encode_documents(self, texts: List[str]) -> List[List[float]]:
+    @retry(
+        retry=retry_if_exception_type(ResourceExhausted),
+        wait=wait_random_exponential(min=1, max=30),
+        stop=stop_after_attempt(6),
+        reraise=True,
+    )
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
         """
-        Encodes a list of text documents into vector embeddings using Gemini API.
+        Embeds one request's worth of texts. Rate-limit (429) errors are retried
+        with jittered exponential backoff, so concurrent batches don't retry in lockstep.
         """
-        print(f"Generating embeddings for {len(texts)} chunks using Gemini API...")
-        
         # Gemini API accepts a list of strings directly
         result = genai.embed_content(
             model=self.model_name,
@@ -32,20 +56,55 @@ class EmbeddingModel:
             task_type="retrieval_document",
             title="Document Chunk" # Optional, helps with quality
         )
-        
         # The result is a dictionary with 'embedding' key
         return result['embedding']
 
-    def encode_query(self, text: str) -> List[float]:
+    def encode_documents(self, texts: List[str]) -> np.ndarray:
         """
-        Encodes a single query string into a vector embedding using Gemini API.
+        Encodes a list of text documents into vector embeddings using Gemini API.
+        Texts are sent in batches of EMBEDDING_BATCH_SIZE, the API's per-request limit,
+        with up to EMBEDDING_CONCURRENCY batches in flight at once.
+        Returns a float32 array of shape (len(texts), EMBEDDING_DIMENSION).
         """
+        print(f"Generating embeddings for {len(texts)} chunks using Gemini API...")
+
+        starts = range(0, len(texts), EMBEDDING_BATCH_SIZE)
+        futures = [self._batch_pool.submit(self._embed_batch, texts[start:start + EMBEDDING_BATCH_SIZE]) for start in starts]
+
+        embeddings = np.empty((len(texts), EMBEDDING_DIMENSION), dtype=np.float32)
+        # Collect in submission order into one contiguous float32 array. Note that
+        # qdrant-client's models still validate it into nested Python lists when
+        # the upsert Batch is built, so this saves no conversion on the way out.
+        for start, future in zip(starts, futures):
+            embeddings[start:start + EMBEDDING_BATCH_SIZE] = future.result()
+        return embeddings
+
+    def encode_query(self, text: str) -> np.ndarray:
+        """
+        Encodes a single query string into a float32 vector embedding using Gemini API.
+        The most recent QUERY_CACHE_SIZE queries are served from memory.
+        """
+        with self._query_cache_lock:
+            embedding = self._query_cache.get(text)
+            if embedding is not None:
+                self._query_cache.move_to_end(text)
+                return embedding
+
         result = genai.embed_content(
             model=self.model_name,
             content=text,
             task_type="retrieval_query"
         )
-        return result['embedding']
+        embedding = np.asarray(result['embedding'], dtype=np.float32)
+        # Cached arrays are shared between callers, so make them read-only
+        embedding.flags.writeable = False
+
+        with self._query_cache_lock:
+            self._query_cache[text] = embedding
+            self._query_cache.move_to_end(text)
+            if len(self._query_cache) > QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+        return embedding
 
 # Instantiate a single instance to be used as a dependency
 try:
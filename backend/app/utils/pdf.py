@@ -0,0 +1,42 @@
+# backend/app/utils/pdf.py
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Iterator, List
+import pymupdf
+
+# Smaller PDFs are extracted in-process; MuPDF is fast enough that starting
+# worker processes only pays off for very long documents
+PARALLEL_MIN_PAGES = 256
+# Pages extracted per worker task, so each task opens the PDF only once
+PAGES_PER_TASK = 64
+
+
+def _extract_pages(file_path: str, start: int, stop: int) -> List[str]:
+    """Extracts the text of pages [start, stop). Runs in a worker process."""
+    with pymupdf.open(file_path) as doc:
+        return [doc[i].get_text("text") for i in range(start, stop)]
+
+
+def iter_pdf_text(file_path: str) -> Iterator[str]:
+    """
+    Yields the text of a PDF one page at a time, in page order, using
+    PyMuPDF's plain-text mode. Very long PDFs are split into page ranges
+    extracted in parallel by a process pool.
+    """
+    with pymupdf.open(file_path) as doc:
+        n_pages = doc.page_count
+        workers = min(os.cpu_count() or 1, -(-n_pages // PAGES_PER_TASK))
+        if n_pages < PARALLEL_MIN_PAGES or workers < 2:
+            for page in doc:
+                yield page.get_text("text")
+            return
+
+    starts = range(0, n_pages, PAGES_PER_TASK)
+    stops = [min(start + PAGES_PER_TASK, n_pages) for start in starts]
+    # Spawn rather than fork: the parent runs threads and gRPC channels that don't survive a fork
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for texts in pool.map(_extract_pages, repeat(file_path), starts, stops):
+            yield from texts
@@ -0,0 +1,45 @@
+# backend/app/worker.py
+
+import asyncio
+import os
+from arq.connections import RedisSettings
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+from app.db.qdrant import ensure_qdrant_collection_exists
+from app.services import ingestion
+from app.utils.embeddings import get_embedding_model
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+
+async def process_document_task(ctx, document_id: str):
+    """
+    Runs the ingestion pipeline for a document. The pipeline is async and keeps
+    its blocking stages in threads, so the worker can keep several jobs in flight.
+    """
+    await ingestion.process_document_task(document_id)
+
+
+async def startup(ctx):
+    """
+    Loads the embedding model and checks the Qdrant collection once when the
+    worker boots, instead of on every job.
+    """
+    get_embedding_model()
+    await asyncio.to_thread(ensure_qdrant_collection_exists)
+    print("Ingestion worker ready.")
+
+
+class WorkerSettings:
+    functions = [process_document_task]
+    on_startup = startup
+    redis_settings = RedisSettings.from_dsn(REDIS_URL)
+    max_jobs = int(os.getenv("WORKER_MAX_JOBS", "4"))
+    job_timeout = 3600 # Large PDFs can take a while to embed
+
+# To run the worker:
+# 1. Make sure you are in the 'backend' directory.
+# 2. Run the command: arq app.worker.WorkerSettings
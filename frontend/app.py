@@ -1,56 +1,196 @@
 # frontend/app.py
 
+import hashlib
+import itertools
+import re
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit
 import streamlit as st
-import requests
-import time
-import os
+from streamlit.errors import StreamlitAPIException
+import httpx
+
+from async_client import UPLOAD_PART_SIZE, content_hash, has_document, run, stream_query, upload_pdfs, upload_pdf_in_parts, submit_youtube, submit_web, list_docs, delete_doc, warm_up
 
 # --- Configuration ---
-BACKEND_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:8000")
+# Seconds between status checks while submitted documents are processing
+JOB_POLL_INTERVAL = 2
+# Chat messages shown at first, and added each time older ones are expanded
+CHAT_WINDOW = 20
+# Video id of a youtube.com watch URL (?v=...) or a youtu.be short link, as the backend accepts them
+YOUTUBE_ID_RE = re.compile(r"^(?:https?://)?(?:[\w-]+\.)*(?:youtube\.com/[^?#]*\?(?:[^#]*&)?v=|youtu\.be/)([\w-]{11})")
 
 # --- UI Setup ---
 st.set_page_config(page_title="Smart Knowledge Assistant", page_icon="🧠", layout="wide")
+warm_up()
 st.title("🧠 Smart Knowledge Assistant")
 st.write("Upload your documents, ask questions, and get intelligent answers.")
 
 # --- Session State Initialization ---
 if "messages" not in st.session_state:
     st.session_state.messages = []
+# Number of most recent chat messages drawn on each rerun
+if "chat_window" not in st.session_state:
+    st.session_state.chat_window = CHAT_WINDOW
+# Changed whenever documents are added or removed, to invalidate the cached list
+if "docs_version" not in st.session_state:
+    st.session_state.docs_version = 0
+
+# Ids of submitted documents the backend is still processing
+if "pending_jobs" not in st.session_state:
+    st.session_state.pending_jobs = []
+
+# Ids of documents deleted this session, hidden until the cached list is refreshed
+if "deleted_ids" not in st.session_state:
+    st.session_state.deleted_ids = set()
+
+# Hashes of URLs already submitted this session, so repeat clicks don't re-ingest them
+if "submitted_hashes" not in st.session_state:
+    st.session_state.submitted_hashes = set()
+
+@st.cache_resource
+def _document_versions():
+    # Shared by all sessions, so one session's new version never matches
+    # a list another session cached before its own changes
+    return itertools.count(1)
+
+def invalidate_documents():
+    st.session_state.docs_version = next(_document_versions())
+
+# Reruns within the TTL reuse the last result; `version` changes whenever it goes stale.
+# Failures raise, so they are not cached.
+@st.cache_data(ttl=15, max_entries=32, show_spinner=False)
+def fetch_documents(version: int):
+    """Documents plus those still processing ("jobs"), from a single request."""
+    [response] = run(list_docs)
+    response.raise_for_status()
+    return response.json()
+
+# URL checks run once per distinct URL rather than on every rerun
+@st.cache_data(max_entries=256, show_spinner=False)
+def normalize_youtube(url: str) -> Optional[str]:
+    """Canonical watch URL for a YouTube video link, or None if it isn't one."""
+    match = YOUTUBE_ID_RE.match(url.strip())
+    return f"https://www.youtube.com/watch?v={match.group(1)}" if match else None
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def normalize_web(url: str) -> Optional[str]:
+    """The URL with its scheme and host lowercased and fragment dropped, or None if invalid."""
+    parts = urlsplit(url.strip())
+    if parts.scheme.lower() not in ("http", "https") or not parts.netloc:
+        return None
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ""))
+
+def submission_key(kind, url):
+    return hashlib.blake2b(f"{kind}:{url}".encode(), digest_size=8).hexdigest() if url else ""
+
+def claim_submission(key):
+    """Marks a submission as sent; False if it already was, e.g. after a double click."""
+    if key in st.session_state.submitted_hashes:
+        return False
+    st.session_state.submitted_hashes.add(key)
+    return True
+
+def track_job(document_id):
+    st.session_state.pending_jobs.append(str(document_id))
+    invalidate_documents()
+
+# Re-polls on its own while jobs are pending, without rerunning the whole app
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def pending_jobs_panel():
+    # Each tick fetches under a new version; the sidebar reuses that cached result
+    invalidate_documents()
+    try:
+        jobs = {job["id"]: job for job in fetch_documents(st.session_state.docs_version)["jobs"]}
+    except httpx.HTTPError:
+        st.caption("Could not check processing status.")
+        return
+    pending = [job for job in st.session_state.pending_jobs if job in jobs]
+    if len(pending) < len(st.session_state.pending_jobs):
+        # Something finished; rerun the app so the document list shows it
+        st.session_state.pending_jobs = pending
+        st.rerun()
+    for job in pending:
+        st.caption(f"⏳ Processing {jobs[job]['filename']}")
 
 # --- Sidebar for Document Ingestion ---
 with st.sidebar:
     st.header("Add to Knowledge Base")
 
+    # Submissions queued by the buttons below as (call, handler) pairs. They are sent
+    # together once all of them are drawn, so several sources go up concurrently.
+    submissions = []
+
+    def queue_pdfs(files):
+        # Skip files the knowledge base already has, checked by content hash in one round of HEADs
+        hashes = [content_hash(f) for f in files]
+        known = run(*[lambda client, h=h: has_document(client, h) for h in hashes], return_exceptions=True)
+        for f in [f for f, is_known in zip(files, known) if is_known is True]:
+            st.info(f"'{f.name}' is already in the knowledge base.")
+        files = [f for f, is_known in zip(files, known) if is_known is not True]
+        if not files:
+            return
+        # The bar tracks the transfer; processing then continues in the background
+        progress_bar = st.progress(0)
+        uploaded = []
+        def show_result(result):
+            uploaded.append(result)
+            progress_bar.progress(len(uploaded) / len(files))
+            if "error" in result:
+                st.error(f"Error uploading '{result['filename']}': {result['error']}")
+            elif result["duplicate"]:
+                st.info(f"'{result['filename']}' is already in the knowledge base.")
+            else:
+                track_job(result["document_id"])
+                st.success(f"Successfully uploaded '{result['filename']}'.")
+        def show_failure(outcome):
+            if isinstance(outcome, httpx.HTTPStatusError):
+                st.error(f"Error: {outcome.response.status_code}")
+            elif isinstance(outcome, Exception):
+                st.error(f"Connection error: {outcome}")
+        # Large files go up in parts; the rest share one batch request.
+        # The file objects are handed over so the client reads them in chunks.
+        small = [(f.name, f, f.type) for f in files if f.size <= UPLOAD_PART_SIZE]
+        for f in files:
+            if f.size > UPLOAD_PART_SIZE:
+                submissions.append((
+                    lambda client, f=f: upload_pdf_in_parts(client, f.name, f, f.type, on_result=show_result),
+                    show_failure,
+                ))
+        if small:
+            submissions.append((lambda client: upload_pdfs(client, small, on_result=show_result), show_failure))
+
+    def queue_url(key, submit, url, label):
+        if not claim_submission(key):
+            return
+        def show_outcome(outcome):
+            if isinstance(outcome, Exception):
+                st.session_state.submitted_hashes.discard(key)
+                st.error(f"Connection error: {outcome}")
+            elif outcome.status_code == 202:
+                track_job(outcome.json()["document_id"])
+                st.success(f"Successfully submitted {label}.")
+            else:
+                st.session_state.submitted_hashes.discard(key)
+                st.error(f"Error: {outcome.text}")
+        submissions.append((lambda client: submit(client, url), show_outcome))
+
     # PDF Uploader
-    uploaded_file = st.file_uploader("Upload a PDF", type="pdf")
-    if uploaded_file:
-        if st.button("Process PDF"):
-            with st.spinner("Processing PDF..."):
-                files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
-                try:
-                    response = requests.post(f"{BACKEND_URL}/api/documents/upload", files=files)
-                    if response.status_code == 202:
-                        st.success(f"Successfully uploaded '{uploaded_file.name}'.")
-                    else:
-                        st.error(f"Error: {response.text}")
-                except requests.exceptions.RequestException as e:
-                    st.error(f"Connection error: {e}")
+    uploaded_files = st.file_uploader("Upload PDFs", type="pdf", accept_multiple_files=True)
+    if uploaded_files:
+        if st.button("Process PDFs"):
+            queue_pdfs(uploaded_files)
 
     st.divider()
 
     # YouTube URL
     youtube_url = st.text_input("Enter a YouTube URL", placeholder="https://www.youtube.com/watch?v=...")
-    if st.button("Process YouTube Video"):
-        if youtube_url:
-            with st.spinner("Processing YouTube URL..."):
-                try:
-                    response = requests.post(f"{BACKEND_URL}/api/documents/youtube", json={"url": youtube_url})
-                    if response.status_code == 202:
-                        st.success("Successfully submitted YouTube URL.")
-                    else:
-                        st.error(f"Error: {response.text}")
-                except requests.exceptions.RequestException as e:
-                    st.error(f"Connection error: {e}")
+    youtube_video = normalize_youtube(youtube_url)
+    youtube_key = submission_key("youtube", youtube_video)
+    if st.button("Process YouTube Video", disabled=youtube_key in st.session_state.submitted_hashes):
+        if youtube_video:
+            queue_url(youtube_key, submit_youtube, youtube_video, "YouTube URL")
+        elif youtube_url:
+            st.warning("That doesn't look like a YouTube video URL.")
         else:
             st.warning("Please enter a YouTube URL.")
 
@@ -58,82 +198,113 @@ with st.sidebar:
 
     # Web Page URL
     web_url = st.text_input("Enter a Web Page URL", placeholder="https://example.com/article")
-    if st.button("Process Web Page"):
-        if web_url:
-            with st.spinner("Processing Web Page URL..."):
-                try:
-                    response = requests.post(f"{BACKEND_URL}/api/documents/web", json={"url": web_url})
-                    if response.status_code == 202:
-                        st.success("Successfully submitted Web Page URL.")
-                    else:
-                        st.error(f"Error: {response.text}")
-                except requests.exceptions.RequestException as e:
-                    st.error(f"Connection error: {e}")
+    web_page = normalize_web(web_url)
+    web_key = submission_key("web", web_page)
+    if st.button("Process Web Page", disabled=web_key in st.session_state.submitted_hashes):
+        if web_page:
+            queue_url(web_key, submit_web, web_page, "Web Page URL")
+        elif web_url:
+            st.warning("Please enter a full http(s) web page URL.")
         else:
             st.warning("Please enter a web page URL.")
 
+    # Everything filled in above, in one go
+    if st.button("Process All", disabled=not (uploaded_files or youtube_video or web_page)):
+        if uploaded_files:
+            queue_pdfs(uploaded_files)
+        if youtube_video:
+            queue_url(youtube_key, submit_youtube, youtube_video, "YouTube URL")
+        if web_page:
+            queue_url(web_key, submit_web, web_page, "Web Page URL")
+
+    if submissions:
+        outcomes = run(*[call for call, _ in submissions], return_exceptions=True)
+        for (_, handle), outcome in zip(submissions, outcomes):
+            handle(outcome)
+
     st.divider()
     
     # --- Document Management Section ---
     st.header("Manage Documents")
+
+    if st.session_state.pending_jobs:
+        pending_jobs_panel()
     
-    # Function to fetch documents
-    def fetch_documents():
-        try:
-            response = requests.get(f"{BACKEND_URL}/api/documents")
-            if response.status_code == 200:
-                return response.json()
-            else:
-                st.error("Failed to fetch documents.")
-                return []
-        except Exception as e:
-            st.error(f"Connection error: {e}")
-            return []
+    # Function to report the outcome of a delete request. Toasts outlive the rerun
+    # that follows, and a deleted document is hidden from the cached list straight
+    # away instead of waiting to fetch it again.
+    def report_deletion(response, doc_id, filename, announce=True):
+        if isinstance(response, Exception):
+            st.toast(f"Error deleting '{filename}': {response}", icon="❌")
+            return False
+        if response.status_code == 204:
+            st.session_state.deleted_ids.add(doc_id)
+            if announce:
+                st.toast(f"Deleted '{filename}'", icon="🗑️")
+            return True
+        st.toast(f"Failed to delete '{filename}': {response.text}", icon="❌")
+        return False
 
     # Function to delete document
     def delete_document(doc_id, filename):
+        [response] = run(lambda client: delete_doc(client, doc_id), return_exceptions=True)
+        return report_deletion(response, doc_id, filename)
+
+    def rerun_panel():
+        # Clicks in the panel normally rerun just the fragment, but Streamlit folds them
+        # into a full rerun when one is already due, and a fragment scope is invalid then
         try:
-            response = requests.delete(f"{BACKEND_URL}/api/documents/{doc_id}")
-            if response.status_code == 204:
-                st.success(f"Deleted '{filename}'")
-                return True
-            else:
-                st.error(f"Failed to delete '{filename}': {response.text}")
-                return False
-        except Exception as e:
-            st.error(f"Error: {e}")
-            return False
+            st.rerun(scope="fragment")
+        except StreamlitAPIException:
+            st.rerun()
 
     # Display Documents
-    documents = fetch_documents()
-    if documents:
-        if st.button("Delete All Documents", type="primary"):
-            progress_bar = st.progress(0)
-            deleted_count = 0
-            for i, doc in enumerate(documents):
-                if delete_document(doc['id'], doc['filename']):
-                    deleted_count += 1
-                progress_bar.progress((i + 1) / len(documents))
-            
-            if deleted_count == len(documents):
-                st.success("All documents deleted successfully.")
-            else:
-                st.warning(f"Deleted {deleted_count} out of {len(documents)} documents.")
-            
-            time.sleep(1)
-            st.rerun()
+    # A fragment, so its Delete buttons rerun only this list rather than the whole app
+    @st.fragment
+    def documents_panel():
+        try:
+            documents = fetch_documents(st.session_state.docs_version)["documents"]
+            # Ids missing from the fetched list are confirmed gone and need no hiding
+            st.session_state.deleted_ids.intersection_update(doc["id"] for doc in documents)
+            documents = [doc for doc in documents if doc["id"] not in st.session_state.deleted_ids]
+        except httpx.HTTPStatusError:
+            st.error("Failed to fetch documents.")
+            documents = []
+        except Exception as e:
+            st.error(f"Connection error: {e}")
+            documents = []
+        if documents:
+            if st.button("Delete All Documents", type="primary"):
+                progress_bar = st.progress(0)
+                # Send every delete at once; the progress bar advances as each one returns
+                responses = run(
+                    *[lambda client, doc_id=doc['id']: delete_doc(client, doc_id) for doc in documents],
+                    on_done=lambda done: progress_bar.progress(done / len(documents)),
+                    return_exceptions=True,
+                )
+                deleted_count = sum(
+                    report_deletion(response, doc['id'], doc['filename'], announce=False)
+                    for response, doc in zip(responses, documents)
+                )
+
+                if deleted_count == len(documents):
+                    st.toast("All documents deleted successfully.", icon="✅")
+                else:
+                    st.toast(f"Deleted {deleted_count} out of {len(documents)} documents.", icon="⚠️")
+                rerun_panel()
+
+            for doc in documents:
+                with st.expander(f"{doc['filename']} ({doc['status']})"):
+                    st.caption(f"Type: {doc['source_type']}")
+                    st.caption(f"Uploaded: {doc['upload_date'][:10]}")
+                    st.caption(f"Chunks: {doc['chunk_count']}")
+                    if st.button("Delete", key=doc['id']):
+                        if delete_document(doc['id'], doc['filename']):
+                            rerun_panel()
+        else:
+            st.info("No documents found.")
 
-        for doc in documents:
-            with st.expander(f"{doc['filename']} ({doc['status']})"):
-                st.caption(f"Type: {doc['source_type']}")
-                st.caption(f"Uploaded: {doc['upload_date'][:10]}")
-                st.caption(f"Chunks: {doc['chunk_count']}")
-                if st.button("Delete", key=doc['id']):
-                    if delete_document(doc['id'], doc['filename']):
-                        time.sleep(1)
-                        st.rerun()
-    else:
-        st.info("No documents found.")
+    documents_panel()
 
 # --- Main Chat Interface ---
 st.header("💬 Chat with Your Documents")
@@ -141,8 +312,13 @@ st.header("💬 Chat with Your Documents")
 # Add the toggle for AI enhancement
 enhance_with_ai = st.toggle("Enhance with AI's general knowledge", value=False, help="When enabled, the AI will use its own knowledge to provide more complete answers, in addition to the content from your documents.")
 
-# Display existing chat messages
-for message in st.session_state.messages:
+# Display existing chat messages, newest CHAT_WINDOW first; older ones on request
+hidden_messages = len(st.session_state.messages) - st.session_state.chat_window
+if hidden_messages > 0:
+    if st.button(f"Show {min(hidden_messages, CHAT_WINDOW)} older messages"):
+        st.session_state.chat_window += CHAT_WINDOW
+        st.rerun()
+for message in st.session_state.messages[-st.session_state.chat_window:]:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
@@ -154,24 +330,15 @@ if prompt := st.chat_input("Ask a question about your documents..."):
 
     # Generate and Stream Assistant Response
     with st.chat_message("assistant"):
-        message_placeholder = st.empty()
-        full_response = ""
         try:
             payload = {"query": prompt, "enhance_with_ai": enhance_with_ai}
-            with requests.post(f"{BACKEND_URL}/api/query", json=payload, stream=True) as r:
-                r.raise_for_status()
-                for chunk in r.iter_content(chunk_size=8192):
-                    if chunk:
-                        decoded_chunk = chunk.decode('utf-8')
-                        full_response += decoded_chunk
-                        message_placeholder.markdown(full_response + "▌")
-                        time.sleep(0.01)
-            message_placeholder.markdown(full_response)
-        except requests.exceptions.RequestException as e:
+            # Streamlit batches the redraws itself as pieces arrive
+            full_response = st.write_stream(stream_query(payload))
+        except httpx.HTTPError as e:
             full_response = f"Error connecting to the backend: {e}"
-            message_placeholder.error(full_response)
+            st.error(full_response)
         except Exception as e:
             full_response = f"An unexpected error occurred: {e}"
-            message_placeholder.error(full_response)
+            st.error(full_response)
 
     st.session_state.messages.append({"role": "assistant", "content": full_response})
\ No newline at end of file
@@ -0,0 +1,261 @@
+# frontend/async_client.py
+
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import uuid
+from contextvars import ContextVar
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+import httpx
+import streamlit as st
+
+# --- Configuration ---
+BACKEND_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:8000")
+# Cap on requests in flight at once, to stay within the backend's limits
+MAX_CONCURRENT_REQUESTS = 8
+REQUEST_TIMEOUT = 60
+# Start-up health checks give up quickly rather than delay the first page
+WARM_UP_TIMEOUT = 2
+# Files larger than one part are uploaded in parts of this size, a few at a time
+UPLOAD_PART_SIZE = 8 * 1024 * 1024
+UPLOAD_PART_CONCURRENCY = 4
+# Attempts per part before giving up on the whole file
+UPLOAD_PART_ATTEMPTS = 3
+HASH_BLOCK_SIZE = 1024 * 1024
+# SSE lines end at CRLF, CR or LF, exactly as the backend frames them. Not
+# str.splitlines, which also breaks on characters like U+2028 or \x0c.
+SSE_LINE_BREAK = re.compile(r"\r\n|\r|\n")
+
+# A backend call: takes the shared client and returns the awaitable request
+Call = Callable[[httpx.AsyncClient], Awaitable[Any]]
+
+
+# --- Backend calls ---
+async def upload_pdfs(
+    client: httpx.AsyncClient,
+    files: List[Tuple[str, BinaryIO, str]],
+    on_result: Optional[Callable[[Dict], None]] = None,
+) -> List[Dict]:
+    """
+    Uploads (filename, file, content_type) files in one multipart request, streaming
+    each file object in chunks rather than materialising it as bytes. The
+    backend answers with an NDJSON line per file; `on_result` sees each as it arrives.
+    """
+    results = []
+    payload = [("files", file) for file in files]
+    async with client.stream("POST", "/api/documents/upload_batch", files=payload) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line:
+                results.append(json.loads(line))
+                if on_result:
+                    _in_script(on_result, results[-1])
+    return results
+
+async def upload_pdf_in_parts(
+    client: httpx.AsyncClient,
+    filename: str,
+    file: BinaryIO,
+    content_type: str,
+    on_result: Optional[Callable[[Dict], None]] = None,
+) -> Dict:
+    """
+    Uploads a large file as UPLOAD_PART_SIZE parts sent concurrently, retrying
+    parts that fail in transit, then asks the backend to join them. Returns (and
+    passes to `on_result`) a result line shaped like those of upload_pdfs.
+    """
+    upload_id = uuid.uuid4().hex
+    size = file.seek(0, os.SEEK_END)
+    part_count = max(1, -(-size // UPLOAD_PART_SIZE))
+    semaphore = asyncio.Semaphore(UPLOAD_PART_CONCURRENCY)
+
+    async def send_part(index: int):
+        async with semaphore:
+            # No await between seek and read, so parts never interleave on the shared file
+            file.seek(index * UPLOAD_PART_SIZE)
+            part = file.read(UPLOAD_PART_SIZE)
+            for attempt in range(1, UPLOAD_PART_ATTEMPTS + 1):
+                try:
+                    response = await client.post(
+                        "/api/documents/upload_part",
+                        data={"upload_id": upload_id, "index": str(index)},
+                        files={"part": (f"{filename}.{index}", part, content_type)},
+                    )
+                    response.raise_for_status()
+                    return
+                except httpx.TransportError:
+                    if attempt == UPLOAD_PART_ATTEMPTS:
+                        raise
+
+    try:
+        await asyncio.gather(*[send_part(index) for index in range(part_count)])
+        response = await client.post(
+            "/api/documents/finalize",
+            json={"upload_id": upload_id, "filename": filename, "part_count": part_count},
+        )
+        response.raise_for_status()
+        body = response.json()
+        result = {"filename": filename, "document_id": body["document_id"], "duplicate": body["duplicate"]}
+    except httpx.HTTPError as e:
+        result = {"filename": filename, "error": str(e)}
+    if on_result:
+        _in_script(on_result, result)
+    return result
+
+def content_hash(file: BinaryIO) -> str:
+    """BLAKE2b-256 of a file's content, read in blocks; matches the backend's hash."""
+    hasher = hashlib.blake2b(digest_size=32)
+    file.seek(0)
+    while block := file.read(HASH_BLOCK_SIZE):
+        hasher.update(block)
+    file.seek(0)
+    return hasher.hexdigest()
+
+async def has_document(client: httpx.AsyncClient, content_hash: str) -> bool:
+    response = await client.head(f"/api/documents/by_hash/{content_hash}")
+    return response.status_code == 200
+
+async def submit_youtube(client: httpx.AsyncClient, url: str) -> httpx.Response:
+    return await client.post("/api/documents/youtube", json={"url": url})
+
+async def submit_web(client: httpx.AsyncClient, url: str) -> httpx.Response:
+    return await client.post("/api/documents/web", json={"url": url})
+
+async def list_docs(client: httpx.AsyncClient) -> httpx.Response:
+    return await client.get("/api/documents", params={"include_jobs": 1})
+
+async def healthz(client: httpx.AsyncClient) -> httpx.Response:
+    return await client.get("/healthz", timeout=WARM_UP_TIMEOUT)
+
+async def delete_doc(client: httpx.AsyncClient, doc_id: str) -> httpx.Response:
+    return await client.delete(f"/api/documents/{doc_id}")
+
+
+def _sse_lines(chunks: Iterator[str]) -> Iterator[str]:
+    """Splits a stream of decoded text into SSE lines, whatever the read boundaries."""
+    buffer = ""
+    for text in chunks:
+        buffer += text
+        # Hold back a trailing CR, which may be the first half of a CRLF
+        end = len(buffer) - 1 if buffer.endswith("\r") else len(buffer)
+        *lines, rest = SSE_LINE_BREAK.split(buffer[:end])
+        buffer = rest + buffer[end:]
+        yield from lines
+    if buffer:
+        yield from SSE_LINE_BREAK.split(buffer.removesuffix("\r"))
+
+def stream_query(payload: Dict) -> Iterator[str]:
+    """
+    Streams an answer from /api/query, yielding the text of each server-sent event.
+    Lines are decoded incrementally, so multibyte characters split across network
+    reads arrive intact. Answers can take a while to start, so there is no timeout.
+    """
+    with backend_client().stream("POST", "/api/query", json=payload, timeout=None) as response:
+        response.raise_for_status()
+        data = []
+        for line in _sse_lines(response.iter_text()):
+            if line.startswith("data:"):
+                data.append(line[6:] if line.startswith("data: ") else line[5:])
+            elif not line and data:
+                yield "\n".join(data)
+                data = []
+        if data:
+            yield "\n".join(data)
+
+
+# --- Runner ---
+@st.cache_resource
+def _backend() -> Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]:
+    """
+    One event loop thread and one pooled AsyncClient shared by every session and
+    rerun, so keep-alive connections to the backend are reused instead of being
+    reopened by each call.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="backend-client", daemon=True).start()
+    limits = httpx.Limits(max_connections=MAX_CONCURRENT_REQUESTS)
+    return loop, httpx.AsyncClient(base_url=BACKEND_URL, timeout=REQUEST_TIMEOUT, limits=limits)
+
+@st.cache_resource
+def backend_client() -> httpx.Client:
+    """Pooled blocking client for calls consumed directly in the script thread, e.g. streams."""
+    limits = httpx.Limits(max_connections=MAX_CONCURRENT_REQUESTS)
+    return httpx.Client(base_url=BACKEND_URL, timeout=REQUEST_TIMEOUT, limits=limits)
+
+_warm_up_lock = threading.Lock()
+_warm_up_thread: Optional[threading.Thread] = None
+_warmed_up = False
+
+def warm_up():
+    """
+    Calls /healthz over both pooled clients, so their connections are open and the
+    backend has built its lazy state before the first real request. The calls run
+    in a background thread so the first page renders without waiting for them.
+    Only success is remembered: after a failure, the next rerun tries again.
+    """
+    global _warm_up_thread
+    with _warm_up_lock:
+        if _warmed_up or (_warm_up_thread and _warm_up_thread.is_alive()):
+            return
+        # Resolved here: cached resources belong to the script thread
+        loop, client = _backend()
+        _warm_up_thread = threading.Thread(
+            target=_warm_up_clients, args=(loop, client, backend_client()), name="warm-up", daemon=True
+        )
+        _warm_up_thread.start()
+
+def _warm_up_clients(loop: asyncio.AbstractEventLoop, client: httpx.AsyncClient, sync_client: httpx.Client):
+    global _warmed_up
+    try:
+        asyncio.run_coroutine_threadsafe(healthz(client), loop).result().raise_for_status()
+        sync_client.get("/healthz", timeout=WARM_UP_TIMEOUT).raise_for_status()
+    except httpx.HTTPError:
+        return
+    _warmed_up = True
+
+# Streamlit elements may only be updated from the script thread; callbacks made by a
+# call running on the event loop are queued here and run by the waiting run()
+_script_callbacks: ContextVar[queue.SimpleQueue] = ContextVar("_script_callbacks")
+
+def _in_script(callback: Callable, *args):
+    _script_callbacks.get().put((callback, args))
+
+def run(*calls: Call, on_done: Optional[Callable[[int], None]] = None, return_exceptions: bool = False) -> List[Any]:
+    """
+    Runs backend calls concurrently over the shared connection pool and returns
+    their results in call order. As with asyncio.gather, the first exception is
+    raised unless `return_exceptions` is set, in which case it is returned in
+    place of that call's result. `on_done` is called with the number of finished
+    calls each time one completes, e.g. to drive a progress bar.
+    """
+    loop, client = _backend()
+    events = queue.SimpleQueue()
+
+    async def run_call(call: Call):
+        _script_callbacks.set(events)
+        return await call(client)
+
+    futures = [asyncio.run_coroutine_threadsafe(run_call(call), loop) for call in calls]
+    for future in futures:
+        future.add_done_callback(events.put)
+
+    finished = 0
+    while finished < len(futures):
+        event = events.get()
+        if isinstance(event, concurrent.futures.Future):
+            finished += 1
+            if event.exception() and not return_exceptions:
+                for future in futures:
+                    future.cancel()
+                raise event.exception()
+            if on_done:
+                on_done(finished)
+        else:
+            callback, args = event
+            callback(*args)
+    return [future.exception() or future.result() for future in futures]